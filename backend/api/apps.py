@@ -0,0 +1,33 @@
+from django.apps import AppConfig
+from django.conf import settings
+from django.core.signals import request_started
+from django.db.models.signals import post_delete, post_save
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+
+
+class ApiConfig(AppConfig):
+    name = 'api'
+
+    def ready(self):
+        """
+        Шрифт для PDF списка покупок регистрируется один раз при старте,
+        версия справочников и рецептов меняется при их изменении, постоянные
+        соединения с базой проверяются в начале запроса
+        """
+        from recipes.models import Ingredient, Recipe, Tag
+
+        from .cache import bump_catalog_version
+        from .db import check_connections
+
+        pdfmetrics.registerFont(
+            TTFont('FreeSans', settings.BASE_DIR / 'data' / 'FreeSans.ttf'))
+        for model in (Ingredient, Tag, Recipe):
+            for signal in (post_save, post_delete):
+                signal.connect(
+                    bump_catalog_version,
+                    sender=model,
+                    dispatch_uid=f'catalog_version_{model.__name__}',
+                )
+        request_started.connect(
+            check_connections, dispatch_uid='check_db_connections')
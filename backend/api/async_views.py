@@ -0,0 +1,43 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+from api.db import check_connections
+
+executor = (
+    ThreadPoolExecutor(settings.DB_POOL_SIZE, 'db-pool')
+    if settings.DB_POOL_SIZE else None
+)
+
+
+def async_view(view):
+    """
+    Асинхронная обёртка представления для режима ASGI.
+
+    Django 3.2 выполняет синхронные представления под ASGI в одном общем
+    потоке, и запросы обрабатываются по очереди. Обёртка выполняет
+    представление вместе с отрисовкой ответа в пуле потоков, поэтому
+    запросы на чтение обрабатываются параллельно. При DB_POOL_SIZE пул
+    ограничен, и каждый поток держит своё постоянное соединение с базой.
+    """
+    def call(request, *args, **kwargs):
+        close_old_connections()
+        check_connections()
+        try:
+            response = view(request, *args, **kwargs)
+            if callable(getattr(response, 'render', None)):
+                response = response.render()
+            return response
+        finally:
+            close_old_connections()
+
+    async_call = sync_to_async(
+        call, thread_sensitive=False, executor=executor)
+
+    async def wrapper(request, *args, **kwargs):
+        return await async_call(request, *args, **kwargs)
+
+    wrapper.csrf_exempt = getattr(view, 'csrf_exempt', False)
+    return wrapper
@@ -0,0 +1,51 @@
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+
+from recipes.models import Tag
+
+
+def get_catalog_version_key(model):
+    return f'catalog_version_{model._meta.label_lower}'
+
+
+def get_catalog_version(model):
+    """
+    Версия справочника — время его последнего изменения в целых секундах.
+    Хранится в кэше `catalog`, общем для всех процессов: по умолчанию
+    это файловый кэш, поэтому изменение из другого воркера
+    или management-команды видно сразу.
+    """
+    versions = caches['catalog']
+    key = get_catalog_version_key(model)
+    version = versions.get(key)
+    if version is None:
+        versions.add(key, math.ceil(time.time()), None)
+        version = versions.get(key)
+    return version
+
+
+def bump_catalog_version(sender, **kwargs):
+    """
+    Обработчик post_save и post_delete справочников. Каждое изменение
+    сдвигает версию хотя бы на секунду, иначе Last-Modified не изменится.
+    """
+    versions = caches['catalog']
+    key = get_catalog_version_key(sender)
+    version = versions.get(key) or 0
+    versions.set(
+        key, max(math.ceil(time.time()), math.ceil(version) + 1), None)
+
+
+def get_tag_ids():
+    """
+    Соответствие slug -> id тегов, кэшируется до изменения тегов
+    """
+    key = f'tag_ids_{get_catalog_version(Tag)}'
+    tag_ids = cache.get(key)
+    if tag_ids is None:
+        tag_ids = dict(Tag.objects.values_list('slug', 'id'))
+        cache.set(key, tag_ids, settings.CATALOG_CACHE_TIMEOUT)
+    return tag_ids
@@ -0,0 +1,78 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+REPLICA_DATABASE = 'replica'
+
+_read_from_replica = ContextVar('read_from_replica', default=False)
+
+
+@contextmanager
+def read_from_replica():
+    """Запросы на чтение внутри блока выполняются на реплике"""
+    token = _read_from_replica.set(True)
+    try:
+        yield
+    finally:
+        _read_from_replica.reset(token)
+
+
+def check_connections(**kwargs):
+    """
+    Отмечает постоянные соединения для проверки в начале запроса.
+    Сама проверка выполняется при первом обращении к соединению, поэтому
+    запросы без SQL, например ответы 304, в базу не ходят. В Django 3.2
+    нет CONN_HEALTH_CHECKS, настройка проверяется здесь.
+    """
+    for connection in connections.all():
+        if (
+            connection.connection is not None
+            and connection.settings_dict.get('CONN_HEALTH_CHECKS')
+        ):
+            install_health_check(connection)
+            connection.health_check_pending = True
+
+
+def install_health_check(connection):
+    """
+    Перед первым использованием отмеченного соединения оно проверяется
+    и закрывается, если перестало отвечать: запрос откроет новое
+    """
+    if 'ensure_connection' in vars(connection):
+        return
+    ensure_connection = connection.ensure_connection
+
+    def ensure_healthy_connection():
+        if connection.health_check_pending:
+            connection.health_check_pending = False
+            if (
+                connection.connection is not None
+                and not connection.is_usable()
+            ):
+                connection.close()
+        ensure_connection()
+
+    connection.health_check_pending = False
+    connection.ensure_connection = ensure_healthy_connection
+
+
+class ReadReplicaRouter:
+    """
+    Направляет чтение внутри read_from_replica() на реплику, если она
+    настроена. Запись и миграции всегда идут в основную базу.
+    """
+    def db_for_read(self, model, **hints):
+        if _read_from_replica.get() and REPLICA_DATABASE in settings.DATABASES:
+            return REPLICA_DATABASE
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA_DATABASE
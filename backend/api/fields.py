@@ -0,0 +1,80 @@
+import binascii
+import tempfile
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from drf_extra_fields.fields import Base64FieldMixin, Base64ImageField
+from PIL import Image
+from rest_framework import serializers
+
+BASE64_CHUNK_SIZE = 64 * 1024
+
+
+def format_size(size):
+    """Размер в байтах для сообщений: 10 МБ, 1,5 МБ, 512 КБ, 100 байт"""
+    for unit, power in (('МБ', 2), ('КБ', 1)):
+        if size >= 1024 ** power:
+            value = round(size / 1024 ** power, 1)
+            return f'{value:g} {unit}'.replace('.', ',')
+    return f'{size} байт'
+
+
+class StreamingBase64ImageField(Base64ImageField):
+    """
+    Картинка в base64 с ограничением размера. Размер проверяется
+    до декодирования, декодирование идёт частями во временный файл.
+    """
+    def to_internal_value(self, base64_data):
+        if base64_data in self.EMPTY_VALUES:
+            return None
+        if not isinstance(base64_data, str):
+            raise ValidationError(self.INVALID_FILE_MESSAGE)
+        header, _, base64_data = base64_data.rpartition(';base64,')
+        size = len(base64_data) * 3 // 4
+        if size > settings.RECIPE_IMAGE_MAX_SIZE:
+            raise ValidationError(
+                'Картинка больше '
+                f'{format_size(settings.RECIPE_IMAGE_MAX_SIZE)}')
+        file = UploadedFile(
+            tempfile.SpooledTemporaryFile(
+                max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE),
+            name=str(uuid.uuid4()),
+        )
+        try:
+            for start in range(0, len(base64_data), BASE64_CHUNK_SIZE):
+                file.write(binascii.a2b_base64(
+                    base64_data[start:start + BASE64_CHUNK_SIZE]))
+            file.size = file.tell()
+            file.seek(0)
+            with Image.open(file) as image:
+                extension = (image.format or '').lower()
+        except (binascii.Error, ValueError, OSError):
+            file.close()
+            raise ValidationError(self.INVALID_FILE_MESSAGE)
+        if extension not in self.ALLOWED_TYPES:
+            file.close()
+            raise ValidationError(self.INVALID_TYPE_MESSAGE)
+        file.name = f'{file.name}.{extension}'
+        file.seek(0)
+        return super(Base64FieldMixin, self).to_internal_value(file)
+
+
+class ImageRenditionsField(serializers.ReadOnlyField):
+    """
+    Ссылки на уменьшенные копии картинки рецепта по форматам и ширинам.
+    Пусто, пока копии не готовы.
+    """
+    def to_representation(self, value):
+        request = self.context.get('request')
+        storage = self.parent.Meta.model._meta.get_field('image').storage
+        result = {}
+        for extension, names in (value or {}).items():
+            result[extension] = {}
+            for width, name in names.items():
+                url = storage.url(name)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                result[extension][width] = url
+        return result
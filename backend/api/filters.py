@@ -1,10 +1,17 @@
-from django_filters.rest_framework import (AllValuesMultipleFilter,
-                                           BooleanFilter, CharFilter,
-                                           FilterSet)
+from django.db.models import Exists, OuterRef
+from django_filters.rest_framework import (BooleanFilter, CharFilter,
+                                           ChoiceFilter, FilterSet,
+                                           MultipleChoiceFilter)
 
+from api.cache import get_tag_ids
+from api.search import search_recipes
 from recipes.models import Ingredient, Recipe
 
 
+def get_tag_choices():
+    return [(slug, slug) for slug in get_tag_ids()]
+
+
 class SearchIngrFilter(FilterSet):
     """
     Фильтр ингредиентов
@@ -22,7 +29,15 @@ class RecipeFilter(FilterSet):
     """
     is_favorited = BooleanFilter(method='get_is_favorited')
     is_in_shopping_cart = BooleanFilter(method='get_is_in_shopping_cart')
-    tags = AllValuesMultipleFilter(field_name='tags__slug')
+    tags = MultipleChoiceFilter(
+        choices=get_tag_choices,
+        method='get_tags',
+    )
+    search = CharFilter(method='get_search')
+    ordering = ChoiceFilter(
+        choices=(('popular', 'popular'),),
+        method='get_ordering',
+    )
 
     class Meta:
         model = Recipe
@@ -37,3 +52,28 @@ class RecipeFilter(FilterSet):
         if bool(value) and not self.request.user.is_anonymous:
             return queryset.filter(in_shopping_cart__user=self.request.user)
         return queryset.exclude(in_shopping_cart__user=self.request.user)
+
+    def get_tags(self, queryset, name, value):
+        """
+        Рецепты хотя бы с одним из тегов: подзапрос EXISTS
+        вместо соединения, поэтому рецепты не дублируются
+        """
+        if not value:
+            return queryset
+        tag_ids = get_tag_ids()
+        return queryset.filter(Exists(Recipe.tags.through.objects.filter(
+            recipe=OuterRef('pk'),
+            tag_id__in=[tag_ids[slug] for slug in value],
+        )))
+
+    def get_search(self, queryset, name, value):
+        """
+        Поиск по названию и описанию, самые релевантные рецепты первыми
+        """
+        return search_recipes(queryset, value)
+
+    def get_ordering(self, queryset, name, value):
+        """
+        Сортировка по популярности: по числу добавлений в избранное
+        """
+        return queryset.order_by('-favorites_count', '-pub_date')
@@ -0,0 +1,61 @@
+import os
+
+from django.http import HttpResponse
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                               CollectorRegistry, Counter, Histogram,
+                               generate_latest, multiprocess)
+
+REQUESTS = Counter(
+    'foodgram_http_requests_total',
+    'Число запросов по маршрутам',
+    ['view', 'method', 'status'],
+)
+REQUEST_DURATION = Histogram(
+    'foodgram_http_request_duration_seconds',
+    'Длительность обработки запроса',
+    ['view', 'method'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+REQUEST_QUERIES = Histogram(
+    'foodgram_http_request_db_queries',
+    'Число запросов к базе за один запрос',
+    ['view'],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 200),
+)
+RESPONSE_SIZE = Histogram(
+    'foodgram_http_response_size_bytes',
+    'Размер ответа',
+    ['view'],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304),
+)
+PDF_RENDER_DURATION = Histogram(
+    'foodgram_shopping_cart_pdf_render_seconds',
+    'Длительность отрисовки PDF списка покупок',
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+
+
+def observe_request(view, method, status, duration, queries, size):
+    REQUESTS.labels(view, method, status).inc()
+    REQUEST_DURATION.labels(view, method).observe(duration)
+    REQUEST_QUERIES.labels(view).observe(queries)
+    if size is not None:
+        RESPONSE_SIZE.labels(view).observe(size)
+
+
+def get_registry():
+    """
+    Под gunicorn с несколькими воркерами значения собираются из общего
+    каталога PROMETHEUS_MULTIPROC_DIR, куда пишет каждый процесс
+    """
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def metrics_view(request):
+    """Метрики в текстовом формате Prometheus"""
+    return HttpResponse(
+        generate_latest(get_registry()), content_type=CONTENT_TYPE_LATEST)
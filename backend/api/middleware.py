@@ -0,0 +1,194 @@
+import json
+import logging
+import random
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from api import metrics
+
+logger = logging.getLogger(__name__)
+
+_profile = ContextVar('query_profile', default=None)
+
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|%s|\?")
+LISTS = re.compile(r'\((?:\s*\?\s*,)+\s*\?\s*\)')
+
+
+def fingerprint(sql):
+    """SQL без значений: одинаковые запросы с разными параметрами совпадают"""
+    return LISTS.sub('(...)', LITERALS.sub('?', sql))
+
+
+class QueryProfile:
+    def __init__(self, track_sql=True):
+        self.count = 0
+        self.duration = 0.0
+        self.track_sql = track_sql
+        self.fingerprints = Counter()
+
+    def add(self, sql, duration):
+        self.count += 1
+        self.duration += duration
+        if self.track_sql:
+            self.fingerprints[fingerprint(sql)] += 1
+
+    def repeated(self, threshold):
+        return {
+            sql: count
+            for sql, count in self.fingerprints.most_common()
+            if count > threshold
+        }
+
+
+def profile_query(execute, sql, params, many, context):
+    profile = _profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.add(sql, time.perf_counter() - start)
+
+
+def install_profiler(connection, **kwargs):
+    if profile_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(profile_query)
+
+
+def enable_query_profiling():
+    connection_created.connect(install_profiler, dispatch_uid='sql_profiler')
+    for connection in connections.all():
+        install_profiler(connection)
+
+
+class QueryProfilerMiddleware:
+    """
+    Профилирование SQL по выборке запросов: число запросов, время в базе
+    и повторяющиеся запросы (признак N+1). Результат отдаётся в заголовке
+    Server-Timing и пишется в лог одной строкой JSON; у потоковых ответов
+    строка пишется после чтения тела, а заголовка нет.
+
+    Включается SQL_PROFILER_SAMPLE_RATE, доля профилируемых запросов
+    от 0 до 1. Запросы к базе учитываются в любом потоке, в том числе
+    в пуле асинхронных представлений.
+    """
+    def __init__(self, get_response):
+        if not settings.SQL_PROFILER_SAMPLE_RATE:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        enable_query_profiling()
+
+    def __call__(self, request):
+        if random.random() >= settings.SQL_PROFILER_SAMPLE_RATE:
+            return self.get_response(request)
+        profile = QueryProfile()
+        token = _profile.set(profile)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _profile.reset(token)
+        if response.streaming:
+            response.streaming_content = self.profile_stream(
+                response.streaming_content, profile,
+                lambda: self.log(request, response, profile, start))
+            return response
+        total = self.log(request, response, profile, start)
+        response['Server-Timing'] = (
+            f'db;dur={profile.duration * 1000:.2f};'
+            f'desc="{profile.count} queries", '
+            f'total;dur={total * 1000:.2f}'
+        )
+        return response
+
+    def profile_stream(self, content, profile, log):
+        """
+        Потоковое тело читается после возврата ответа: запросы при его
+        чтении тоже учитываются, строка лога пишется в конце. Заголовок
+        Server-Timing к этому моменту уже отправлен, поэтому у потоковых
+        ответов его нет.
+        """
+        iterator = iter(content)
+        try:
+            while True:
+                token = _profile.set(profile)
+                try:
+                    chunk = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    _profile.reset(token)
+                yield chunk
+        finally:
+            log()
+
+    def log(self, request, response, profile, start):
+        total = time.perf_counter() - start
+        repeated = profile.repeated(settings.SQL_PROFILER_REPEAT_THRESHOLD)
+        match = request.resolver_match
+        logger.log(
+            logging.WARNING if repeated else logging.INFO,
+            json.dumps({
+                'method': request.method,
+                'path': request.path,
+                'view': match.view_name if match else None,
+                'status': response.status_code,
+                'queries': profile.count,
+                'db_ms': round(profile.duration * 1000, 2),
+                'total_ms': round(total * 1000, 2),
+                'repeated': repeated,
+            }, ensure_ascii=False),
+        )
+        return total
+
+
+class MetricsMiddleware:
+    """
+    Метрики Prometheus по каждому маршруту: число и длительность
+    запросов, число запросов к базе и размер ответа.
+    Включается METRICS_ENABLED.
+    """
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        enable_query_profiling()
+
+    def __call__(self, request):
+        profile = _profile.get()
+        token = None
+        if profile is None:
+            profile = QueryProfile(track_sql=False)
+            token = _profile.set(profile)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            if token is not None:
+                _profile.reset(token)
+        match = request.resolver_match
+        metrics.observe_request(
+            view=match.view_name if match else 'unknown',
+            method=request.method,
+            status=response.status_code,
+            duration=time.perf_counter() - start,
+            queries=profile.count,
+            size=get_response_size(response),
+        )
+        return response
+
+
+def get_response_size(response):
+    if response.has_header('Content-Length'):
+        return int(response['Content-Length'])
+    if response.streaming:
+        return None
+    return len(response.content)
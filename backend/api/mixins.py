@@ -1,6 +1,71 @@
+import hashlib
+import math
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from rest_framework.mixins import ListModelMixin, RetrieveModelMixin
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet
 
+from api.cache import get_catalog_version
+from api.db import read_from_replica
+
+
+class ReplicaReadMixin:
+    """
+    Безопасные запросы читают данные с реплики базы. Действие, которому
+    нужны только что записанные данные, объявляется с use_replica=False.
+    """
+    use_replica = True
+
+    def dispatch(self, request, *args, **kwargs):
+        if not self.use_replica or request.method not in SAFE_METHODS:
+            return super().dispatch(request, *args, **kwargs)
+        with read_from_replica():
+            return super().dispatch(request, *args, **kwargs)
+
 
 class RetrivelistViewSet(ListModelMixin, RetrieveModelMixin, GenericViewSet):
     pass
+
+
+class CachedRetrivelistViewSet(ReplicaReadMixin, RetrivelistViewSet):
+    """
+    Вьюсет для редко меняющихся справочников: ETag и Last-Modified
+    по версии справочника, ответ 304 без обращения к базе и кэш
+    сериализованных данных
+    """
+    def get_list_response(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(
+            self.get_list_response, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        version = get_catalog_version(self.queryset.model)
+        etag = '"{}"'.format(hashlib.md5(
+            f'{version}:{request.accepted_media_type}'.encode()
+        ).hexdigest())
+        response = get_conditional_response(
+            request, etag=etag, last_modified=math.ceil(version))
+        if response is None:
+            key = 'catalog_data_' + hashlib.md5(
+                f'{version}:{request.get_full_path()}'.encode()
+            ).hexdigest()
+            data = cache.get(key)
+            if data is None:
+                response = handler(request, *args, **kwargs)
+                cache.set(key, response.data, settings.CATALOG_CACHE_TIMEOUT)
+            else:
+                response = Response(data)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(math.ceil(version))
+        return response
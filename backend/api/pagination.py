@@ -1,9 +1,78 @@
-from rest_framework.pagination import PageNumberPagination
+from django.core.paginator import EmptyPage, Page, Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class EstimatedPage(Page):
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор с оценкой количества объектов по плану запроса PostgreSQL
+    вместо точного COUNT(*). Оценка только выводится в ответе: номер
+    страницы и наличие следующей проверяются по самой выборке, поэтому
+    заниженная оценка не приводит к 404 на существующих страницах.
+    """
+    def validate_number(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            return super().validate_number(number)
+        if number < 1:
+            raise EmptyPage('That page number is less than 1')
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        object_list = list(
+            self.object_list[bottom:bottom + self.per_page + 1])
+        if not object_list and number > 1:
+            raise EmptyPage('That page contains no results')
+        return EstimatedPage(
+            object_list[:self.per_page], number, self,
+            has_next=len(object_list) > self.per_page,
+        )
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return super().count
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        return plan[0]['Plan']['Plan Rows']
 
 
 class LimitPageNumberPagination(PageNumberPagination):
     """
-    Пагинатор кол-ва рецептов на странице
+    Пагинатор кол-ва рецептов на странице.
+    С параметром `count=estimate` количество оценивается, а не считается.
+    """
+    page_size_query_param = 'limit'
+    page_size = 6
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if request.query_params.get(self.count_query_param) == 'estimate':
+            self.django_paginator_class = EstimatedCountPaginator
+        return super().paginate_queryset(queryset, request, view)
+
+
+class RecipeCursorPagination(CursorPagination):
+    """
+    Курсорный пагинатор ленты рецептов: без OFFSET и COUNT(*)
     """
     page_size_query_param = 'limit'
     page_size = 6
+    ordering = ('-pub_date', '-id')
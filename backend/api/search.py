@@ -0,0 +1,236 @@
+import re
+import threading
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+from django.db import connection
+from django.db.models import (Case, F, FloatField, IntegerField, Q, Value,
+                              When)
+from django.db.models.functions import Upper
+
+from api.cache import get_catalog_version
+from recipes.models import Ingredient, Recipe
+
+TRIGRAM_SIMILARITY_THRESHOLD = 0.3
+RECIPE_SEARCH_CONFIG = 'russian'
+RECIPE_NAME_WEIGHT = 1.0
+RECIPE_TEXT_WEIGHT = 0.4
+RECIPE_FALLBACK_LIMIT = 500
+
+
+def words(text):
+    return re.findall(r'\w+', text.casefold())
+
+
+def trigrams(text):
+    """
+    Триграммы строки по правилам pg_trgm: каждое слово дополняется
+    двумя пробелами слева и одним справа
+    """
+    result = set()
+    for word in words(text):
+        word = f'  {word} '
+        result.update(word[i:i + 3] for i in range(len(word) - 2))
+    return result
+
+
+class IngredientIndex:
+    """
+    Индекс ингредиентов в памяти процесса для поиска по началу названия.
+    Загружается при первом обращении и перестраивается при смене
+    версии справочника ингредиентов.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._data = None
+
+    def load(self):
+        items = sorted(
+            (name.casefold(), pk, name, measurement_unit)
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            ).order_by().iterator()
+        )
+        keys = [item[0] for item in items]
+        postings = defaultdict(list)
+        sizes = []
+        for position, key in enumerate(keys):
+            key_trigrams = trigrams(key)
+            sizes.append(len(key_trigrams))
+            for trigram in key_trigrams:
+                postings[trigram].append(position)
+        return (
+            keys,
+            [
+                {'id': pk, 'name': name, 'measurement_unit': unit}
+                for _, pk, name, unit in items
+            ],
+            postings,
+            sizes,
+        )
+
+    def get_data(self):
+        version = get_catalog_version(Ingredient)
+        if self._version != version:
+            with self._lock:
+                if self._version != version:
+                    self._data = self.load()
+                    self._version = version
+        return self._data
+
+    def search(self, prefix, limit=None):
+        keys, items, _, _ = self.get_data()
+        prefix = prefix.casefold()
+        result = []
+        position = bisect_left(keys, prefix)
+        while (position < len(keys) and keys[position].startswith(prefix)
+               and (limit is None or len(result) < limit)):
+            result.append(items[position])
+            position += 1
+        return result
+
+    def search_fuzzy(self, query, limit=None):
+        """
+        Сначала совпадения по началу названия, затем по подстроке,
+        затем похожие по триграммам в порядке убывания сходства
+        """
+        keys, items, postings, sizes = self.get_data()
+        query = query.casefold()
+        result = self.search(query, limit)
+        if limit is not None and len(result) >= limit:
+            return result
+        found = {item['id'] for item in result}
+        substring = [
+            position for position, key in enumerate(keys)
+            if query in key and items[position]['id'] not in found
+        ]
+        found.update(items[position]['id'] for position in substring)
+        query_trigrams = trigrams(query)
+        shared = Counter(
+            position
+            for trigram in query_trigrams
+            for position in postings.get(trigram, ())
+        )
+        similar = []
+        for position, count in shared.items():
+            similarity = count / (
+                len(query_trigrams) + sizes[position] - count)
+            if (similarity >= TRIGRAM_SIMILARITY_THRESHOLD
+                    and items[position]['id'] not in found):
+                similar.append((-similarity, keys[position], position))
+        result.extend(items[position] for position in substring)
+        result.extend(items[position] for *_, position in sorted(similar))
+        return result[:limit]
+
+
+ingredient_index = IngredientIndex()
+
+
+def search_ingredients(query, limit=None):
+    """
+    Ранжированный поиск ингредиентов: на PostgreSQL по GIN-индексу pg_trgm,
+    на остальных базах по индексу в памяти
+    """
+    if connection.vendor != 'postgresql':
+        return ingredient_index.search_fuzzy(query, limit)
+    from django.contrib.postgres.search import TrigramSimilarity
+
+    query = query.upper()
+    queryset = Ingredient.objects.annotate(
+        search_name=Upper('name'),
+    ).filter(
+        Q(search_name__contains=query)
+        | Q(search_name__trigram_similar=query)
+    ).annotate(
+        rank=Case(
+            When(search_name__startswith=query, then=Value(0)),
+            When(search_name__contains=query, then=Value(1)),
+            default=Value(2),
+            output_field=IntegerField(),
+        ),
+        similarity=TrigramSimilarity('search_name', query),
+    ).order_by(
+        'rank', '-similarity', 'name'
+    ).values('id', 'name', 'measurement_unit')
+    return list(queryset[:limit])
+
+
+class RecipeIndex:
+    """
+    Обратный индекс рецептов в памяти процесса для баз без полнотекстового
+    поиска. Слово из запроса совпадает со словами рецепта, которые с него
+    начинаются; вес слов названия и описания как у A и B в ts_rank.
+    Перестраивается при изменении рецептов.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._data = None
+
+    def load(self):
+        postings = defaultdict(Counter)
+        for pk, name, text in Recipe.objects.values_list(
+            'id', 'name', 'text'
+        ).order_by().iterator():
+            for word in words(name):
+                postings[word][pk] += RECIPE_NAME_WEIGHT
+            for word in words(text):
+                postings[word][pk] += RECIPE_TEXT_WEIGHT
+        return sorted(postings), postings
+
+    def get_data(self):
+        version = get_catalog_version(Recipe)
+        if self._version != version:
+            with self._lock:
+                if self._version != version:
+                    self._data = self.load()
+                    self._version = version
+        return self._data
+
+    def search(self, query):
+        """Ранги рецептов, в которых есть все слова запроса"""
+        keys, postings = self.get_data()
+        ranks = None
+        for term in set(words(query)):
+            term_ranks = Counter()
+            position = bisect_left(keys, term)
+            while position < len(keys) and keys[position].startswith(term):
+                term_ranks.update(postings[keys[position]])
+                position += 1
+            if ranks is None:
+                ranks = term_ranks
+            else:
+                ranks = Counter({
+                    pk: rank + term_ranks[pk]
+                    for pk, rank in ranks.items() if pk in term_ranks
+                })
+        return ranks or {}
+
+
+recipe_index = RecipeIndex()
+
+
+def search_recipes(queryset, query):
+    """
+    Полнотекстовый поиск рецептов по названию и описанию с сортировкой
+    по релевантности: на PostgreSQL по GIN-индексу search_vector,
+    на остальных базах по индексу в памяти, не больше
+    RECIPE_FALLBACK_LIMIT самых релевантных
+    """
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        search_query = SearchQuery(
+            query, config=RECIPE_SEARCH_CONFIG, search_type='websearch')
+        queryset = queryset.filter(search_vector=search_query).annotate(
+            rank=SearchRank(F('search_vector'), search_query))
+    else:
+        ranks = dict(Counter(
+            recipe_index.search(query)).most_common(RECIPE_FALLBACK_LIMIT))
+        queryset = queryset.filter(id__in=ranks).annotate(rank=Case(
+            *(When(id=pk, then=Value(rank)) for pk, rank in ranks.items()),
+            default=Value(0.0),
+            output_field=FloatField(),
+        ))
+    return queryset.order_by('-rank', '-pub_date', '-id')
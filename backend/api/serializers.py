@@ -1,9 +1,13 @@
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from djoser.serializers import UserCreateSerializer, UserSerializer
-from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 
+from api.cache import get_tag_ids
+from api.fields import ImageRenditionsField, StreamingBase64ImageField
 from recipes.models import (CountOfIngredient, Favorite, Ingredient, ListShop,
-                            Recipe, Tag)
+                            ListShopIngredient, Recipe, Tag)
+from recipes.renditions import release_image, schedule_renditions
 from users.models import Subscription, User
 
 
@@ -28,6 +32,9 @@ class NewUserSerializer(UserSerializer):
         request = self.context.get('request')
         if not request or request.user.is_anonymous:
             return False
+        subscriptions = self.context.get('subscriptions')
+        if subscriptions is not None:
+            return obj.id in subscriptions
         user = request.user
         return Subscription.objects.filter(
             following=obj,
@@ -91,13 +98,14 @@ class SubscriptionSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         if not request or request.user.is_anonymous:
             return False
-        user = request.user
-        return Subscription.objects.filter(
-            following=obj.following,
-            follower=user
-        ).exists()
+        return obj.follower_id == request.user.id
 
     def get_recipes(self, obj):
+        recipes = self.context.get('recipes')
+        if recipes is not None:
+            return RecipeMinifiedSerializer(
+                recipes[obj.following_id], many=True
+            ).data
         request = self.context['request']
         if request.GET.get('recipes_limit'):
             recipes_limit = int(request.GET.get('recipes_limit'))
@@ -111,6 +119,8 @@ class SubscriptionSerializer(serializers.ModelSerializer):
         ).data
 
     def get_recipes_count(self, obj):
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
         return Recipe.objects.filter(author=obj.following).count()
 
 
@@ -169,9 +179,11 @@ class SmallRecipeSerializer(serializers.ModelSerializer):
     """
     Сериализатор для краткого отображения сведений о рецепте
     """
+    image_renditions = ImageRenditionsField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_renditions', 'cooking_time')
 
 
 class CountOfIngredientSerializer(serializers.ModelSerializer):
@@ -193,7 +205,7 @@ class AddIngredientSerializer(serializers.ModelSerializer):
     """
     Сериализатор для добавления ингредиентов
     """
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = serializers.IntegerField()
     amount = serializers.IntegerField()
 
     class Meta:
@@ -216,6 +228,17 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
             instance.recipe, context=context).data
 
 
+class RecipeIdsSerializer(serializers.Serializer):
+    """
+    Сериализатор списка рецептов для массового добавления и удаления
+    """
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=100,
+    )
+
+
 class RecipeListSerializer(serializers.ModelSerializer):
     """
     Сериализатор для отображения рецептов
@@ -228,19 +251,24 @@ class RecipeListSerializer(serializers.ModelSerializer):
     )
     is_favorited = serializers.SerializerMethodField(read_only=True)
     is_in_shopping_cart = serializers.SerializerMethodField(read_only=True)
+    image_renditions = ImageRenditionsField()
     last_name = serializers.ReadOnlyField()
 
     class Meta:
         model = Recipe
-        fields = '__all__'
+        exclude = ('favorites_count', 'cart_count', 'search_vector')
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         if not request or request.user.is_anonymous:
             return False
         return Favorite.objects.filter(user=request.user, recipe=obj).exists()
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         if not request or request.user.is_anonymous:
             return False
@@ -252,11 +280,10 @@ class AddRecipeSerializer(serializers.ModelSerializer):
     """
     Сериализатор для добавления рецептов
     """
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(), many=True)
+    tags = serializers.ListField(child=serializers.IntegerField())
     ingredients = AddIngredientSerializer(many=True)
     author = NewUserSerializer(read_only=True)
-    image = Base64ImageField()
+    image = StreamingBase64ImageField()
 
     class Meta:
         model = Recipe
@@ -266,32 +293,36 @@ class AddRecipeSerializer(serializers.ModelSerializer):
 
     def validate(self, data):
         ingredients = data['ingredients']
-        ingredients_list = []
-        for ingredient in ingredients:
-            ingredient_id = ingredient['id']
-            if ingredient_id in ingredients_list:
-                raise serializers.ValidationError({
-                    'ingredients': 'Только уникальные ингредиенты!'
-                })
-            ingredients_list.append(ingredient_id)
-            amount = ingredient['amount']
-            if int(amount) <= 0:
-                raise serializers.ValidationError({
-                    'amount': 'Должен быть хотя-бы один ингредиент'
-                })
+        ingredient_ids = {ingredient['id'] for ingredient in ingredients}
+        if len(ingredient_ids) != len(ingredients):
+            raise serializers.ValidationError({
+                'ingredients': 'Только уникальные ингредиенты!'
+            })
+        if any(int(ingredient['amount']) <= 0 for ingredient in ingredients):
+            raise serializers.ValidationError({
+                'amount': 'Должен быть хотя-бы один ингредиент'
+            })
+        missing = ingredient_ids - set(Ingredient.objects.filter(
+            id__in=ingredient_ids).values_list('id', flat=True))
+        if missing:
+            raise serializers.ValidationError({
+                'ingredients': f'Ингредиенты не найдены: {sorted(missing)}'
+            })
 
         tags = data['tags']
         if not tags:
             raise serializers.ValidationError({
                 'tags': 'Нужно указать минимум один тег!'
             })
-        tags_list = []
-        for tag in tags:
-            if tag in tags_list:
-                raise serializers.ValidationError({
-                    'tags': 'Тэги должны быть уникальны!'
-                })
-            tags_list.append(tag)
+        if len(set(tags)) != len(tags):
+            raise serializers.ValidationError({
+                'tags': 'Тэги должны быть уникальны!'
+            })
+        missing = set(tags) - set(get_tag_ids().values())
+        if missing:
+            raise serializers.ValidationError({
+                'tags': f'Теги не найдены: {sorted(missing)}'
+            })
 
         cooking_time = data['cooking_time']
         if int(cooking_time) <= 0:
@@ -303,7 +334,7 @@ class AddRecipeSerializer(serializers.ModelSerializer):
     def create_ingredients(self, ingredients, recipe):
         ingredients_in_recipe = [
             CountOfIngredient(
-                ingredient=ingredient['id'],
+                ingredient_id=ingredient['id'],
                 recipe=recipe,
                 amount=ingredient['amount']
             ) for ingredient in ingredients
@@ -311,23 +342,82 @@ class AddRecipeSerializer(serializers.ModelSerializer):
         CountOfIngredient.objects.bulk_create(ingredients_in_recipe)
 
     def create_tags(self, tags, recipe):
-        for tag in tags:
-            recipe.tags.add(tag)
+        recipe.tags.set(tags)
 
+    @transaction.atomic
     def create(self, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
         recipe = Recipe.objects.create(**validated_data)
         self.create_tags(tags, recipe)
         self.create_ingredients(ingredients, recipe)
+        schedule_renditions(recipe)
         return recipe
 
+    def update_ingredients(self, ingredients, recipe):
+        """
+        Изменяет только отличающиеся ингредиенты рецепта.
+        Возвращает True, если состав изменился.
+        """
+        current = {
+            amount.ingredient_id: amount
+            for amount in CountOfIngredient.objects.filter(recipe=recipe)
+        }
+        new = {ingredient['id']: ingredient for ingredient in ingredients}
+        deleted = current.keys() - new.keys()
+        created = [
+            ingredient for ingredient_id, ingredient in new.items()
+            if ingredient_id not in current
+        ]
+        changed = []
+        for ingredient_id, ingredient in new.items():
+            amount = current.get(ingredient_id)
+            if amount is not None and amount.amount != ingredient['amount']:
+                amount.amount = ingredient['amount']
+                changed.append(amount)
+        if not (deleted or created or changed):
+            return False
+        ListShopIngredient.objects.remove_recipe(recipe)
+        if deleted:
+            CountOfIngredient.objects.filter(
+                recipe=recipe, ingredient_id__in=deleted).delete()
+        if changed:
+            CountOfIngredient.objects.bulk_update(changed, ('amount',))
+        if created:
+            self.create_ingredients(created, recipe)
+        ListShopIngredient.objects.add_recipe(recipe)
+        return True
+
+    @transaction.atomic
     def update(self, instance, validated_data):
-        instance.tags.clear()
-        CountOfIngredient.objects.filter(recipe=instance).delete()
+        """
+        В базу пишутся только поля из запроса: счётчики избранного
+        и покупок и миниатюры меняются параллельно другими запросами
+        и фоновой задачей, а в instance они могут быть устаревшими
+        """
         self.create_tags(validated_data.pop('tags'), instance)
-        self.create_ingredients(validated_data.pop('ingredients'), instance)
-        return super().update(instance, validated_data)
+        self.update_ingredients(validated_data.pop('ingredients'), instance)
+        image_name = instance.image.name
+        renditions = instance.image_renditions
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        instance.save(update_fields=validated_data)
+        if instance.image.name != image_name:
+            instance.image_renditions = {}
+            Recipe.objects.filter(id=instance.id).update(image_renditions={})
+            schedule_renditions(instance)
+            transaction.on_commit(
+                lambda: release_image(image_name, renditions))
+        return instance
 
     def to_representation(self, instance):
+        prefetch_related_objects(
+            [instance],
+            'tags',
+            Prefetch(
+                'amounts',
+                queryset=CountOfIngredient.objects.select_related(
+                    'ingredient')
+            ),
+        )
         return RecipeListSerializer(instance, context=self.context).data
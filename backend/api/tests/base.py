@@ -0,0 +1,109 @@
+import base64
+import io
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase, override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+
+from recipes.models import CountOfIngredient, Ingredient, Recipe, Tag
+from users.models import User
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tests-default',
+    },
+    'catalog': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tests-catalog',
+    },
+}
+
+
+def image_base64():
+    """Картинка 1x1 в формате, который принимает API"""
+    buffer = io.BytesIO()
+    Image.new('RGB', (1, 1)).save(buffer, format='PNG')
+    return 'data:image/png;base64,' + base64.b64encode(
+        buffer.getvalue()).decode()
+
+
+def create_user(username):
+    return User.objects.create(
+        username=username,
+        email=f'{username}@example.com',
+        first_name='Тест',
+        last_name=username,
+        password=f'!{username}',
+    )
+
+
+def create_recipe(author, name, tags=(), ingredients=()):
+    recipe = Recipe.objects.create(
+        author=author,
+        name=name,
+        text='Описание',
+        image='recipes/images/test.png',
+        cooking_time=10,
+    )
+    recipe.tags.set(tags)
+    CountOfIngredient.objects.bulk_create(
+        CountOfIngredient(recipe=recipe, ingredient=ingredient, amount=10)
+        for ingredient in ingredients
+    )
+    return recipe
+
+
+def create_catalog():
+    """Три тега и шестьдесят ингредиентов"""
+    tags = [
+        Tag.objects.create(name=f'Тег {number}', color=color,
+                           slug=f'tag{number}')
+        for number, color in enumerate(('#000001', '#000002', '#000003'))
+    ]
+    Ingredient.objects.bulk_create(
+        Ingredient(name=f'Ингредиент {number}', measurement_unit='г')
+        for number in range(60)
+    )
+    return tags, list(Ingredient.objects.order_by('id'))
+
+
+@override_settings(CACHES=TEST_CACHES, MEDIA_ROOT=MEDIA_ROOT)
+class APITestCase(TestCase):
+    """
+    Общие данные тестов API: пользователь с клиентом, теги
+    и ингредиенты. Кэши заменены на locmem, файлы пишутся
+    во временный каталог. Кэш данных очищается перед каждым тестом,
+    кэш версий справочников — нет: версии должны только расти.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('user')
+        cls.tags, cls.ingredients = create_catalog()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.anonymous = APIClient()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+
+@override_settings(CACHES=TEST_CACHES, MEDIA_ROOT=MEDIA_ROOT)
+class APITransactionTestCase(TransactionTestCase):
+    """
+    Для тестов с параллельными запросами: каждый поток работает
+    в своём соединении и видит только закоммиченные данные
+    """
+    def setUp(self):
+        self.user = create_user('user')
+        self.tags, self.ingredients = create_catalog()
@@ -0,0 +1,44 @@
+from django.utils.http import parse_http_date
+
+from api.tests.base import APITestCase
+from recipes.models import Tag
+
+
+class CatalogConditionalTest(APITestCase):
+    """Условные запросы к справочникам обслуживаются без базы"""
+    PATHS = (
+        '/api/tags/',
+        '/api/ingredients/',
+        '/api/ingredients/?name=Ингр',
+    )
+
+    def test_not_modified_without_queries(self):
+        for path in self.PATHS:
+            with self.subTest(path=path):
+                etag = self.anonymous.get(path)['ETag']
+                with self.assertNumQueries(0):
+                    response = self.anonymous.get(
+                        path, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+
+    def test_cached_response_without_queries(self):
+        self.anonymous.get('/api/tags/')
+        with self.assertNumQueries(0):
+            response = self.anonymous.get('/api/tags/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), len(self.tags))
+
+    def test_change_invalidates_etag_and_last_modified(self):
+        response = self.anonymous.get('/api/tags/')
+        etag = response['ETag']
+        last_modified = response['Last-Modified']
+        Tag.objects.create(name='Новый', color='#000004', slug='new')
+        response = self.anonymous.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), len(self.tags) + 1)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertGreater(parse_http_date(response['Last-Modified']),
+                           parse_http_date(last_modified))
+        response = self.anonymous.get(
+            '/api/tags/', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
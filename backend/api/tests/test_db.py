@@ -0,0 +1,116 @@
+from unittest import mock
+
+from django.conf import settings
+from django.db import connections, router
+
+from api.db import (REPLICA_DATABASE, ReadReplicaRouter, check_connections,
+                    read_from_replica)
+from api.tests.base import APITestCase, create_recipe
+from recipes.models import ListShop, Recipe
+
+
+class ReadReplicaRouterTest(APITestCase):
+    """
+    Реплика — зеркало основной базы, как её настраивает тестовый
+    раннер для TEST MIRROR: запросы к ней идут через то же соединение
+    """
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.dict(settings.DATABASES, {
+            REPLICA_DATABASE: {
+                **settings.DATABASES['default'],
+                'TEST': {'MIRROR': 'default'},
+            },
+        })
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        connections[REPLICA_DATABASE] = connections['default']
+        self.addCleanup(connections.__delitem__, REPLICA_DATABASE)
+        self.recipe = create_recipe(self.user, 'Рецепт', self.tags[:1])
+
+    def request_aliases(self, method, path):
+        """Базы, которые роутер выбрал для чтения во время запроса"""
+        aliases = []
+        db_for_read = ReadReplicaRouter.db_for_read
+
+        def record(router, model, **hints):
+            alias = db_for_read(router, model, **hints)
+            aliases.append(alias or 'default')
+            return alias
+
+        with mock.patch.object(ReadReplicaRouter, 'db_for_read', record):
+            response = getattr(self.client, method)(path)
+        return response, aliases
+
+    def test_reads_inside_block_use_replica(self):
+        with read_from_replica():
+            self.assertEqual(Recipe.objects.all().db, REPLICA_DATABASE)
+            self.assertEqual(
+                list(Recipe.objects.values_list('id', flat=True)),
+                [self.recipe.id],
+            )
+            self.assertEqual(router.db_for_write(Recipe), 'default')
+        self.assertEqual(Recipe.objects.all().db, 'default')
+
+    def test_safe_request_reads_from_replica(self):
+        response, aliases = self.request_aliases('get', '/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(aliases)
+        self.assertEqual(set(aliases), {REPLICA_DATABASE})
+
+    def test_write_request_reads_from_default(self):
+        response, aliases = self.request_aliases(
+            'post', f'/api/recipes/{self.recipe.id}/shopping_cart/')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(aliases)
+        self.assertEqual(set(aliases), {'default'})
+
+    def test_shopping_cart_download_reads_from_default(self):
+        ListShop.objects.create(user=self.user, recipe=self.recipe)
+        response, aliases = self.request_aliases(
+            'get', '/api/recipes/download_shopping_cart/?format=json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(aliases)
+        self.assertEqual(set(aliases), {'default'})
+
+    def test_migrations_skip_replica(self):
+        self.assertFalse(
+            router.allow_migrate(
+                REPLICA_DATABASE, 'recipes', model_name='recipe'))
+        self.assertTrue(
+            router.allow_migrate('default', 'recipes', model_name='recipe'))
+
+
+class ConnectionHealthCheckTest(APITestCase):
+    """Постоянное соединение проверяется только перед первым запросом SQL"""
+    def setUp(self):
+        super().setUp()
+        self.connection = connections['default']
+
+    def get_checks(self, path, **headers):
+        with mock.patch.object(
+                type(self.connection), 'is_usable', autospec=True,
+                return_value=True) as is_usable:
+            response = self.anonymous.get(path, **headers)
+        return response, is_usable.call_count
+
+    def test_request_with_queries(self):
+        response, checks = self.get_checks('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(checks, 1)
+
+    def test_not_modified_without_check(self):
+        etag = self.anonymous.get('/api/tags/')['ETag']
+        response, checks = self.get_checks(
+            '/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(checks, 0)
+
+    def test_broken_connection_reopened(self):
+        check_connections()
+        with mock.patch.object(
+                type(self.connection), 'is_usable', return_value=False), \
+                mock.patch.object(self.connection, 'close') as close:
+            self.connection.ensure_connection()
+            self.connection.ensure_connection()
+        close.assert_called_once_with()
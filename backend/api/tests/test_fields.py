@@ -0,0 +1,25 @@
+from django.core.exceptions import ValidationError
+from django.test import SimpleTestCase, override_settings
+
+from api.fields import StreamingBase64ImageField, format_size
+from api.tests.base import image_base64
+
+
+class FormatSizeTest(SimpleTestCase):
+    def test_units(self):
+        for size, text in (
+            (10 * 1024 * 1024, '10 МБ'),
+            (1536 * 1024, '1,5 МБ'),
+            (512 * 1024, '512 КБ'),
+            (100, '100 байт'),
+        ):
+            with self.subTest(size=size):
+                self.assertEqual(format_size(size), text)
+
+
+class StreamingBase64ImageFieldTest(SimpleTestCase):
+    @override_settings(RECIPE_IMAGE_MAX_SIZE=16)
+    def test_size_limit_message(self):
+        with self.assertRaisesMessage(
+                ValidationError, 'Картинка больше 16 байт'):
+            StreamingBase64ImageField().to_internal_value(image_base64())
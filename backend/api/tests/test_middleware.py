@@ -0,0 +1,30 @@
+import json
+
+from django.test import override_settings
+
+from api.tests.test_shopping_cart import ShoppingCartDownloadTestCase
+
+
+@override_settings(SQL_PROFILER_SAMPLE_RATE=1)
+class QueryProfilerMiddlewareTest(ShoppingCartDownloadTestCase):
+    def get_profile(self, logs):
+        self.assertEqual(len(logs.records), 1)
+        return json.loads(logs.records[0].getMessage())
+
+    def test_regular_response(self):
+        with self.assertLogs('api.middleware', 'INFO') as logs:
+            response = self.anonymous.get('/api/tags/')
+        self.assertEqual(
+            self.get_profile(logs)['queries'],
+            int(response['Server-Timing'].split('desc="')[1].split()[0]),
+        )
+
+    def test_streaming_response(self):
+        with self.assertLogs('api.middleware', 'INFO') as logs:
+            response = self.client.get(
+                '/api/recipes/download_shopping_cart/', {'format': 'csv'})
+            self.assertFalse(response.has_header('Server-Timing'))
+            b''.join(response.streaming_content)
+        profile = self.get_profile(logs)
+        self.assertEqual(profile['view'], 'api:recipes-download-shopping-cart')
+        self.assertEqual(profile['queries'], 1)
@@ -0,0 +1,375 @@
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock, skipIf
+
+from django.db import connection, connections
+from django.db.models import F
+from rest_framework.test import APIClient
+
+from api.tests.base import (APITestCase, APITransactionTestCase,
+                            create_recipe, create_user, image_base64)
+from api.views import RecipeViewSet
+from recipes.models import (CountOfIngredient, Favorite, Ingredient,
+                            ListShop, ListShopIngredient, Recipe,
+                            UserRecipeManager)
+
+
+class RecipeListQueriesTest(APITestCase):
+    """Число запросов ленты не зависит от размера страницы"""
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        author = create_user('author')
+        recipes = [
+            create_recipe(author, f'Рецепт {number}', cls.tags,
+                          cls.ingredients[number:number + 3])
+            for number in range(12)
+        ]
+        Favorite.objects.bulk_create(
+            Favorite(user=cls.user, recipe=recipe) for recipe in recipes[::2])
+        ListShop.objects.bulk_create(
+            ListShop(user=cls.user, recipe=recipe) for recipe in recipes[::3])
+
+    def assert_list_queries(self, client, queries):
+        for limit in (2, 10):
+            with self.subTest(limit=limit):
+                with self.assertNumQueries(queries):
+                    response = client.get(f'/api/recipes/?limit={limit}')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data['results']), limit)
+
+    def test_anonymous(self):
+        self.assert_list_queries(self.anonymous, 4)
+
+    def test_authenticated(self):
+        self.assert_list_queries(self.client, 5)
+
+    def test_flags(self):
+        response = self.client.get('/api/recipes/?limit=12')
+        favorited = set(Favorite.objects.values_list('recipe_id', flat=True))
+        in_cart = set(ListShop.objects.values_list('recipe_id', flat=True))
+        for recipe in response.data['results']:
+            self.assertEqual(
+                recipe['is_favorited'], recipe['id'] in favorited)
+            self.assertEqual(
+                recipe['is_in_shopping_cart'], recipe['id'] in in_cart)
+
+
+class RecipeTagFilterTest(APITestCase):
+    """Фильтр по нескольким тегам не дублирует рецепты"""
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        author = create_user('author')
+        cls.tagged = {
+            create_recipe(author, 'Все теги', cls.tags).id,
+            create_recipe(author, 'Два тега', cls.tags[:2]).id,
+            create_recipe(author, 'Один тег', cls.tags[2:]).id,
+        }
+        create_recipe(author, 'Без тегов')
+
+    def test_three_tags(self):
+        path = '/api/recipes/?limit=10&' + '&'.join(
+            f'tags={tag.slug}' for tag in self.tags)
+        self.client.get(path)
+        with self.assertNumQueries(5):
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        ids = [recipe['id'] for recipe in response.data['results']]
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(set(ids), self.tagged)
+        self.assertEqual(response.data['count'], len(self.tagged))
+
+    def test_unknown_tag(self):
+        response = self.client.get('/api/recipes/?tags=unknown')
+        self.assertEqual(response.status_code, 400)
+
+
+class RecipeUpdateQueriesTest(APITestCase):
+    """Изменение рецепта пишет в базу только отличающиеся строки"""
+    def setUp(self):
+        super().setUp()
+        self.recipe = create_recipe(
+            self.user, 'Рецепт', self.tags[:2], self.ingredients[:30])
+        self.path = f'/api/recipes/{self.recipe.id}/'
+        self.data = {
+            'name': 'Рецепт',
+            'text': 'Описание',
+            'cooking_time': 10,
+            'tags': [tag.id for tag in self.tags[:2]],
+            'ingredients': [
+                {'id': ingredient.id, 'amount': 10}
+                for ingredient in self.ingredients[:30]
+            ],
+        }
+
+    def patch(self, queries):
+        with self.assertNumQueries(queries):
+            response = self.client.patch(self.path, self.data, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def get_amounts(self):
+        return set(CountOfIngredient.objects.filter(
+            recipe=self.recipe).values_list('id', 'amount'))
+
+    def test_no_changes(self):
+        amounts = self.get_amounts()
+        self.patch(13)
+        self.assertEqual(self.get_amounts(), amounts)
+
+    def test_one_amount_changed(self):
+        self.data['ingredients'][0]['amount'] = 25
+        amounts = self.get_amounts()
+        response = self.patch(18)
+        changed = CountOfIngredient.objects.get(
+            recipe=self.recipe, ingredient=self.ingredients[0])
+        self.assertEqual(self.get_amounts() - amounts, {(changed.id, 25)})
+        self.assertEqual(len(response.data['ingredients']), 30)
+
+
+class RecipeCreateQueriesTest(APITestCase):
+    """Число запросов создания рецепта не зависит от числа ингредиентов"""
+    def post(self, ingredients):
+        return self.client.post('/api/recipes/', {
+            'name': f'Рецепт из {len(ingredients)}',
+            'text': 'Описание',
+            'cooking_time': 10,
+            'image': image_base64(),
+            'tags': [tag.id for tag in self.tags],
+            'ingredients': [
+                {'id': ingredient.id, 'amount': number + 1}
+                for number, ingredient in enumerate(ingredients)
+            ],
+        }, format='json')
+
+    def test_constant_queries(self):
+        self.post(self.ingredients[:1])
+        for count in (2, 50):
+            with self.subTest(ingredients=count):
+                with self.assertNumQueries(12):
+                    response = self.post(self.ingredients[:count])
+                self.assertEqual(response.status_code, 201)
+                self.assertEqual(
+                    CountOfIngredient.objects.filter(
+                        recipe_id=response.data['id']).count(),
+                    count,
+                )
+
+    def test_missing_ingredient(self):
+        response = self.post(self.ingredients[:2] + [Ingredient(id=0)])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ingredients', response.data)
+        self.assertFalse(Recipe.objects.exists())
+
+
+class RecipeToggleTest(APITestCase):
+    """Добавление в избранное и список покупок одним запросом INSERT"""
+    def setUp(self):
+        super().setUp()
+        self.recipe = create_recipe(
+            create_user('author'), 'Рецепт', self.tags[:1],
+            self.ingredients[:2])
+
+    def test_add(self):
+        path = f'/api/recipes/{self.recipe.id}/shopping_cart/'
+        with self.assertNumQueries(8):
+            response = self.client.post(path)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['id'], self.recipe.id)
+        with self.assertNumQueries(4):
+            response = self.client.post(path)
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/recipes/0/shopping_cart/')
+        self.assertEqual(response.status_code, 404)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.cart_count, 1)
+        self.assertEqual(
+            ListShopIngredient.objects.filter(user=self.user).count(), 2)
+
+    def test_add_bulk(self):
+        Favorite.objects.create(user=self.user, recipe=self.recipe)
+        other = create_recipe(self.user, 'Другой рецепт')
+        response = self.client.post(
+            '/api/recipes/favorite/',
+            {'recipes': [other.id, self.recipe.id, other.id + 100]},
+            format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [item['status'] for item in response.data['recipes']],
+            [201, 400, 404],
+        )
+        other.refresh_from_db()
+        self.assertEqual(other.favorites_count, 1)
+
+
+@skipIf(connection.vendor == 'sqlite',
+        'SQLite не выполняет параллельную запись, тест запускается в CI '
+        'на PostgreSQL')
+class RecipeToggleConcurrencyTest(APITransactionTestCase):
+    """
+    Двойные клики: параллельные добавления одного рецепта дают ровно
+    один ответ 201, остальные 400, без ошибок 500
+    """
+    THREADS = 50
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = create_recipe(
+            create_user('author'), 'Рецепт', self.tags,
+            self.ingredients[:3])
+
+    def post_in_parallel(self, path):
+        barrier = threading.Barrier(self.THREADS)
+
+        def post():
+            client = APIClient()
+            client.force_authenticate(self.user)
+            try:
+                barrier.wait()
+                return client.post(path).status_code
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(self.THREADS) as executor:
+            futures = [executor.submit(post) for _ in range(self.THREADS)]
+        return Counter(future.result() for future in futures)
+
+    def test_favorite(self):
+        statuses = self.post_in_parallel(
+            f'/api/recipes/{self.recipe.id}/favorite/')
+        self.assertEqual(statuses, {201: 1, 400: self.THREADS - 1})
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+
+    def test_shopping_cart(self):
+        statuses = self.post_in_parallel(
+            f'/api/recipes/{self.recipe.id}/shopping_cart/')
+        self.assertEqual(statuses, {201: 1, 400: self.THREADS - 1})
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.cart_count, 1)
+        self.assertEqual(
+            sorted(ListShopIngredient.objects.filter(
+                user=self.user).values_list('total_amount', flat=True)),
+            [10, 10, 10],
+        )
+
+
+class RecipeUpdateConcurrencyTest(APITestCase):
+    """
+    Между чтением рецепта и сохранением правки его строку меняют
+    другие запросы: их изменения не затираются
+    """
+    def setUp(self):
+        super().setUp()
+        self.recipe = create_recipe(
+            self.user, 'Рецепт', self.tags[:1], self.ingredients[:1])
+        self.data = {
+            'name': 'Новое название',
+            'text': 'Описание',
+            'cooking_time': 10,
+            'tags': [self.tags[0].id],
+            'ingredients': [{'id': self.ingredients[0].id, 'amount': 10}],
+        }
+
+    def patch(self, **concurrent):
+        """Правка рецепта, пока параллельно меняются поля concurrent"""
+        get_object = RecipeViewSet.get_object
+
+        def get_stale_object(view):
+            recipe = get_object(view)
+            Recipe.objects.filter(id=recipe.id).update(**concurrent)
+            return recipe
+
+        with mock.patch.object(RecipeViewSet, 'get_object', get_stale_object):
+            response = self.client.patch(
+                f'/api/recipes/{self.recipe.id}/', self.data, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.name, 'Новое название')
+
+    def test_counters_kept(self):
+        self.patch(favorites_count=F('favorites_count') + 1,
+                   cart_count=F('cart_count') + 1)
+        self.assertEqual(self.recipe.favorites_count, 1)
+        self.assertEqual(self.recipe.cart_count, 1)
+
+    def test_renditions_kept_on_text_edit(self):
+        renditions = {'320': 'recipes/images/test_320.webp'}
+        self.patch(image_renditions=renditions)
+        self.assertEqual(self.recipe.image_renditions, renditions)
+
+    def test_renditions_reset_on_new_image(self):
+        self.data['image'] = image_base64()
+        with mock.patch('api.serializers.schedule_renditions'):
+            self.patch(image_renditions={'320': 'old_320.webp'})
+        self.assertNotEqual(self.recipe.image.name, 'recipes/images/test.png')
+        self.assertEqual(self.recipe.image_renditions, {})
+
+
+class RecipeDeletedDuringAddTest(APITransactionTestCase):
+    """
+    Рецепт удаляют, пока его добавляют: внешний ключ не проходит проверку
+    при коммите, запрос повторяется и отвечает 404, а не 500
+    """
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        author = create_user('author')
+        self.kept = create_recipe(author, 'Рецепт', self.tags[:1])
+        self.deleted = create_recipe(author, 'Удалённый', self.tags[:1])
+
+    def delete_concurrently(self):
+        """
+        Первая попытка видит рецепт, но удаление коммитится раньше неё;
+        вторая попытка выполняется уже после удаления
+        """
+        add_recipes = UserRecipeManager.add_recipes
+        attempts = []
+        deleted_id = self.deleted.id
+
+        def add_recipes_during_delete(manager, user, recipe_ids):
+            attempts.append(recipe_ids)
+            if len(attempts) == 2:
+                Recipe.objects.filter(id=deleted_id).delete()
+            added = add_recipes(manager, user, recipe_ids)
+            if len(attempts) == 1:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        'DELETE FROM recipes_recipe_tags '
+                        'WHERE recipe_id = %s', [deleted_id])
+                    cursor.execute(
+                        'DELETE FROM recipes_recipe WHERE id = %s',
+                        [deleted_id])
+            return added
+
+        patcher = mock.patch.object(
+            UserRecipeManager, 'add_recipes', add_recipes_during_delete)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return attempts
+
+    def test_bulk(self):
+        attempts = self.delete_concurrently()
+        response = self.client.post(
+            '/api/recipes/favorite/',
+            {'recipes': [self.kept.id, self.deleted.id]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [item['status'] for item in response.data['recipes']],
+            [201, 404],
+        )
+        self.assertEqual(len(attempts), 2)
+        self.assertEqual(
+            list(Favorite.objects.values_list('recipe_id', flat=True)),
+            [self.kept.id],
+        )
+
+    def test_single(self):
+        self.delete_concurrently()
+        response = self.client.post(
+            f'/api/recipes/{self.deleted.id}/shopping_cart/')
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(ListShop.objects.exists())
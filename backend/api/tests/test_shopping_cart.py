@@ -0,0 +1,116 @@
+import csv
+import io
+import json
+
+from django.core.handlers.asgi import ASGIHandler
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections
+from rest_framework.authtoken.models import Token
+
+from api.tests.base import APITestCase, create_recipe, create_user
+from recipes.models import ListShopIngredient
+
+
+class ShoppingCartDownloadTestCase(APITestCase):
+    """Список покупок пользователя из трёх ингредиентов"""
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        recipe = create_recipe(
+            create_user('author'), 'Рецепт', cls.tags, cls.ingredients[:3])
+        ListShopIngredient.objects.add_recipe(recipe, [cls.user.id])
+        cls.names = sorted(
+            ingredient.name for ingredient in cls.ingredients[:3])
+
+
+class ShoppingCartDownloadQueriesTest(ShoppingCartDownloadTestCase):
+    """Все запросы выгрузки выполняются до возврата ответа"""
+    def test_streamed_formats(self):
+        for file_format in ('txt', 'csv', 'json'):
+            with self.subTest(format=file_format):
+                with self.assertNumQueries(1):
+                    response = self.client.get(
+                        '/api/recipes/download_shopping_cart/',
+                        {'format': file_format})
+                self.assertEqual(response.status_code, 200)
+                with self.assertNumQueries(0):
+                    content = b''.join(response.streaming_content).decode()
+                for name in self.names:
+                    self.assertIn(name, content)
+
+
+class ShoppingCartDownloadASGITest(ShoppingCartDownloadTestCase):
+    """
+    Выгрузка через ASGI: тело ответа отдаётся в цикле событий,
+    где обращения к базе запрещены
+    """
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.token = Token.objects.create(user=cls.user)
+
+    def setUp(self):
+        """
+        Как и тестовый клиент, не даём обработчику закрыть соединение
+        с открытой транзакцией теста
+        """
+        super().setUp()
+        for signal in (request_started, request_finished):
+            signal.disconnect(close_old_connections)
+            self.addCleanup(signal.connect, close_old_connections)
+
+    async def download(self, file_format):
+        """
+        Запрос через ASGIHandler, как его выполняет сервер: AsyncClient
+        в Django 3.2 читает потоковое тело вне цикла событий
+        """
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+
+        path = '/api/recipes/download_shopping_cart/'
+        await ASGIHandler()({
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'root_path': '',
+            'query_string': f'format={file_format}'.encode(),
+            'headers': [
+                (b'host', b'testserver'),
+                (b'authorization', f'Token {self.token.key}'.encode()),
+            ],
+            'client': ('127.0.0.1', 0),
+            'server': ('testserver', 80),
+        }, receive, send)
+        self.assertEqual(messages[0]['status'], 200)
+        return b''.join(
+            message.get('body', b'') for message in messages[1:])
+
+    async def test_txt(self):
+        content = (await self.download('txt')).decode()
+        lines = content.splitlines()
+        self.assertEqual(lines[0], 'Список покупок:')
+        self.assertEqual(len(lines), len(self.names) + 1)
+
+    async def test_csv(self):
+        content = (await self.download('csv')).decode()
+        rows = list(csv.reader(io.StringIO(content)))
+        self.assertEqual(rows[0], ['name', 'measurement_unit', 'amount'])
+        self.assertEqual([row[0] for row in rows[1:]], self.names)
+
+    async def test_json(self):
+        content = (await self.download('json')).decode()
+        self.assertEqual(
+            [item['name'] for item in json.loads(content)], self.names)
+
+    async def test_pdf(self):
+        content = await self.download('pdf')
+        self.assertTrue(content.startswith(b'%PDF'))
@@ -1,6 +1,8 @@
-from django.urls import include, path
+from django.conf import settings
+from django.urls import URLPattern, include, path
 from rest_framework.routers import DefaultRouter
 
+from .async_views import async_view
 from .views import (IngredientViewSet, NewUserViewSet, RecipeViewSet,
                     SubscriptionCreateDestroyView, SubscriptionViewSet,
                     TagViewSet)
@@ -15,9 +17,30 @@ router.register(r'tags', TagViewSet, basename='tags')
 router.register(r'ingredients', IngredientViewSet, basename='ingredients')
 router.register(r'recipes', RecipeViewSet, basename='recipes')
 
+ASYNC_URL_NAMES = {
+    f'{basename}-{route}'
+    for basename in ('recipes', 'tags', 'ingredients', 'subscriptions')
+    for route in ('list', 'detail')
+}
+
+
+def get_router_urls():
+    """
+    В режиме ASGI основные эндпоинты чтения обслуживаются
+    асинхронными обёртками
+    """
+    if not settings.ASYNC_VIEWS:
+        return router.urls
+    return [
+        URLPattern(
+            url.pattern, async_view(url.callback), url.default_args, url.name)
+        if url.name in ASYNC_URL_NAMES else url
+        for url in router.urls
+    ]
+
 
 urlpatterns = [
-    path('', include(router.urls)),
+    path('', include(get_router_urls())),
     path(
         'users/<int:id>/subscribe/',
         SubscriptionCreateDestroyView.as_view(),
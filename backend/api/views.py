@@ -1,36 +1,60 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+import csv
+import hashlib
+import json
+from collections import defaultdict
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import (Count, Exists, F, OuterRef, Prefetch, Sum,
+                              Value, Window)
+from django.db.models.functions import RowNumber
+from django.http import FileResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet as DjoserUserViewSet
 from djoser.views import viewsets
 from reportlab.lib.pagesizes import A4
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.pdfgen.canvas import Canvas
 from rest_framework import filters, mixins
 from rest_framework.decorators import action
 from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.status import (HTTP_201_CREATED, HTTP_204_NO_CONTENT,
-                                   HTTP_400_BAD_REQUEST)
+                                   HTTP_400_BAD_REQUEST, HTTP_404_NOT_FOUND)
 from rest_framework.views import APIView
 
+from api import metrics
 from api.filters import RecipeFilter, SearchIngrFilter
-from api.mixins import RetrivelistViewSet
-from api.pagination import LimitPageNumberPagination
+from api.mixins import CachedRetrivelistViewSet, ReplicaReadMixin
+from api.pagination import LimitPageNumberPagination, RecipeCursorPagination
 from api.permissions import IsAuthorOrAdminOrReadOnly
+from api.renderers import CSVRenderer, PDFRenderer, PlainTextRenderer
+from api.search import ingredient_index, search_ingredients
 from recipes.models import (CountOfIngredient, Favorite, Ingredient, ListShop,
-                            Recipe, Tag)
+                            ListShopIngredient, Recipe, Tag)
 from users.models import Subscription, User
 from .serializers import (AddRecipeSerializer, IngredientSerializer,
-                          NewUserSerializer, RecipeListSerializer,
-                          SmallRecipeSerializer,
+                          NewUserSerializer, RecipeIdsSerializer,
+                          RecipeListSerializer, SmallRecipeSerializer,
                           SubscriptionCreateDeleteSerializer,
                           SubscriptionSerializer, TagSerializer)
 
+SHOPPING_CART_CACHE_TIMEOUT = 60 * 60
+INSERT_ATTEMPTS = 2
+
+
+class Echo:
+    """
+    Буфер для csv.writer, возвращающий записанную строку
+    """
+    def write(self, value):
+        return value
+
 
-class TagViewSet(RetrivelistViewSet):
+class TagViewSet(CachedRetrivelistViewSet):
     """
     Вьюсет для тегов
     """
@@ -39,7 +63,7 @@ class TagViewSet(RetrivelistViewSet):
     http_method_names = ['get', ]
 
 
-class IngredientViewSet(RetrivelistViewSet):
+class IngredientViewSet(CachedRetrivelistViewSet):
     """
     Вьюсет для ингредиентов
     """
@@ -49,18 +73,96 @@ class IngredientViewSet(RetrivelistViewSet):
     filterset_class = SearchIngrFilter
     http_method_names = ['get', ]
 
+    def get_list_response(self, request, *args, **kwargs):
+        """
+        Поиск по началу названия (`name`) обслуживается индексом в памяти,
+        ранжированный поиск с опечатками и по подстроке — параметром `search`
+        """
+        search = request.query_params.get('search')
+        if search:
+            return Response(search_ingredients(
+                search, settings.INGREDIENT_SEARCH_LIMIT))
+        name = request.query_params.get('name')
+        if name:
+            return Response(ingredient_index.search(
+                name, settings.INGREDIENT_SEARCH_LIMIT))
+        return super().get_list_response(request, *args, **kwargs)
+
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     """
     Вьюсет для работы с рецептами
     """
-    queryset = Recipe.objects.all()
     pagination_class = LimitPageNumberPagination
     permission_classes = [IsAuthorOrAdminOrReadOnly]
     filter_backends = [DjangoFilterBackend]
     filterset_class = RecipeFilter
     http_method_names = ['get', 'post', 'put', 'patch', 'delete', ]
 
+    @property
+    def paginator(self):
+        """
+        Курсорная пагинация включается параметром `pagination=cursor`
+        """
+        if self.request.query_params.get('pagination') == 'cursor':
+            self.pagination_class = RecipeCursorPagination
+        return super().paginator
+
+    def get_queryset(self):
+        """
+        Флаги избранного и списка покупок вычисляются в основном запросе,
+        а не отдельным запросом на каждый рецепт
+        """
+        user = self.request.user
+        queryset = Recipe.objects.defer('search_vector').select_related(
+            'author'
+        ).prefetch_related(
+            'tags',
+            Prefetch(
+                'amounts',
+                queryset=CountOfIngredient.objects.select_related(
+                    'ingredient')
+            ),
+        )
+        if user.is_anonymous:
+            return queryset.annotate(
+                is_favorited=Value(False),
+                is_in_shopping_cart=Value(False),
+            )
+        return queryset.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ListShop.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+        )
+
+    def get_serializer_context(self):
+        """
+        Подписки пользователя загружаются один раз на запрос
+        для поля `is_subscribed` автора рецепта
+        """
+        context = super().get_serializer_context()
+        user = self.request.user
+        if user.is_authenticated:
+            context['subscriptions'] = set(
+                Subscription.objects.filter(
+                    follower=user
+                ).values_list('following_id', flat=True)
+            )
+        return context
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        """
+        Ошибки выгрузки списка покупок отдаются в JSON, а не с типом
+        выбранного файла
+        """
+        if (self.action == 'download_shopping_cart'
+                and isinstance(response, Response)
+                and not 200 <= response.status_code < 300):
+            request.accepted_renderer = JSONRenderer()
+            request.accepted_media_type = JSONRenderer.media_type
+        return super().finalize_response(request, response, *args, **kwargs)
+
     def get_serializer_class(self):
         """
         функция выбора сериалайзера изходя из вид запроса
@@ -94,15 +196,122 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return self.add_recipe(ListShop, request, pk)
         return self.delete_recipe(ListShop, request, pk)
 
+    @action(methods=('post', 'delete',), detail=False,
+            url_path='favorite', url_name='favorite-bulk',
+            permission_classes=[IsAuthenticated])
+    def favorite_bulk(self, request):
+        """
+        Метод `favorite_bulk` добавляет или удаляет список рецептов
+        из избранного одним запросом.
+        """
+        if request.method == 'POST':
+            return self.add_recipes(Favorite, request)
+        return self.delete_recipes(Favorite, request)
+
+    @action(methods=('post', 'delete',), detail=False,
+            url_path='shopping_cart', url_name='shopping-cart-bulk',
+            permission_classes=[IsAuthenticated])
+    def shopping_cart_bulk(self, request):
+        """
+        Метод `shopping_cart_bulk` добавляет или удаляет список рецептов
+        из списка покупок одним запросом.
+        """
+        if request.method == 'POST':
+            return self.add_recipes(ListShop, request)
+        return self.delete_recipes(ListShop, request)
+
+    def get_recipe_ids(self, request):
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return list(dict.fromkeys(serializer.validated_data['recipes']))
+
+    def add_recipes(self, model, request):
+        """
+        Метод `add_recipes` добавляет рецепты в список избранного или
+        список покупок и возвращает статус по каждому рецепту:
+        201 — добавлен, 400 — уже был добавлен, 404 — рецепт не найден.
+        """
+        recipe_ids = self.get_recipe_ids(request)
+        new = self.insert_recipes(model, request.user, recipe_ids)
+        existing = new | set(Recipe.objects.filter(
+            id__in=set(recipe_ids) - new).values_list('id', flat=True))
+        return Response({'recipes': [
+            {
+                'id': recipe_id,
+                'status': (HTTP_201_CREATED if recipe_id in new
+                           else HTTP_400_BAD_REQUEST if recipe_id in existing
+                           else HTTP_404_NOT_FOUND),
+            }
+            for recipe_id in recipe_ids
+        ]})
+
+    def delete_recipes(self, model, request):
+        """
+        Метод `delete_recipes` удаляет рецепты из списка избранного или
+        списка покупок и возвращает статус по каждому рецепту:
+        204 — удалён, 400 — не был добавлен, 404 — рецепт не найден.
+        """
+        recipe_ids = self.get_recipe_ids(request)
+        with transaction.atomic():
+            deleted = set(model.objects.select_for_update().filter(
+                user=request.user, recipe_id__in=recipe_ids
+            ).values_list('recipe_id', flat=True))
+            if deleted:
+                model.objects.filter(
+                    user=request.user, recipe_id__in=deleted
+                ).delete()
+                Recipe.objects.filter(id__in=deleted).update(**{
+                    model.recipe_counter: F(model.recipe_counter) - 1})
+                if model is ListShop:
+                    ListShopIngredient.objects.change_recipes(
+                        deleted, [request.user.id], increase=False)
+        existing = deleted | set(Recipe.objects.filter(
+            id__in=set(recipe_ids) - deleted).values_list('id', flat=True))
+        return Response({'recipes': [
+            {
+                'id': recipe_id,
+                'status': (HTTP_204_NO_CONTENT if recipe_id in deleted
+                           else HTTP_400_BAD_REQUEST if recipe_id in existing
+                           else HTTP_404_NOT_FOUND),
+            }
+            for recipe_id in recipe_ids
+        ]})
+
+    def insert_recipes(self, model, user, recipe_ids):
+        """
+        Добавляет рецепты пользователю вместе со счётчиками и списком
+        покупок, возвращает id добавленных. Внешний ключ проверяется
+        при коммите: если рецепт удалили параллельно, коммит падает,
+        и транзакция повторяется — удалённый рецепт в INSERT уже
+        не попадёт.
+        """
+        for attempt in range(INSERT_ATTEMPTS):
+            try:
+                with transaction.atomic():
+                    new = model.objects.add_recipes(user, recipe_ids)
+                    if new:
+                        Recipe.objects.filter(id__in=new).update(**{
+                            model.recipe_counter:
+                                F(model.recipe_counter) + 1})
+                        if model is ListShop:
+                            ListShopIngredient.objects.change_recipes(
+                                new, [user.id], increase=True)
+                return new
+            except IntegrityError:
+                if attempt == INSERT_ATTEMPTS - 1:
+                    raise
+
     def add_recipe(self, model, request, pk):
         """
         Метод `add_recipe` добавляет рецепт
         в список избранного или список покупок.
+        Повторное добавление отсекается в том же запросе INSERT,
+        а не предварительной проверкой.
         """
+        added = self.insert_recipes(model, request.user, [pk])
         recipe = get_object_or_404(Recipe, id=pk)
-        if model.objects.filter(recipe=recipe, user=request.user).exists():
+        if not added:
             return Response(status=HTTP_400_BAD_REQUEST)
-        model.objects.create(recipe=recipe, user=request.user)
         serializer = SmallRecipeSerializer(recipe)
         return Response(data=serializer.data, status=HTTP_201_CREATED)
 
@@ -111,27 +320,29 @@ class RecipeViewSet(viewsets.ModelViewSet):
         Метод `delete_recipe` удаляет рецепт
         из списка избранного или списка покупок.
         """
-        recipe = get_object_or_404(Recipe, id=pk)
-        if model.objects.filter(
-            user=request.user, recipe=recipe
-        ).exists():
-            model.objects.filter(
-                user=request.user, recipe=recipe
+        with transaction.atomic():
+            deleted, _ = model.objects.filter(
+                user=request.user, recipe_id=pk
             ).delete()
+            if deleted:
+                Recipe.objects.filter(id=pk).update(**{
+                    model.recipe_counter: F(model.recipe_counter) - 1})
+                if model is ListShop:
+                    ListShopIngredient.objects.remove_recipe(
+                        pk, [request.user.id])
+        if deleted:
             return Response(status=HTTP_204_NO_CONTENT)
+        get_object_or_404(Recipe, id=pk)
         return Response(status=HTTP_400_BAD_REQUEST)
 
+    @metrics.PDF_RENDER_DURATION.time()
     def canvas_method(self, listshop):
         """
         функция выгрузки списка покупок в PDF
         """
         begin_position_x, begin_position_y = 30, 730
-        response = HttpResponse(
-            content_type='application/pdf')
-        response['Content-Disposition'] = (
-            'attachment; filename="shopping_cart.pdf"')
-        canvas = Canvas(response, pagesize=A4)
-        pdfmetrics.registerFont(TTFont('FreeSans', 'data/FreeSans.ttf'))
+        buffer = BytesIO()
+        canvas = Canvas(buffer, pagesize=A4)
         canvas.setFont('FreeSans', 25)
         canvas.setTitle('Список покупок')
         canvas.drawString(begin_position_x,
@@ -151,18 +362,94 @@ class RecipeViewSet(viewsets.ModelViewSet):
             begin_position_y -= 30
         canvas.showPage()
         canvas.save()
-        return response
+        return buffer.getvalue()
+
+    def text_method(self, listshop):
+        """
+        функция выгрузки списка покупок в текстовый файл
+        """
+        yield 'Список покупок:\n'
+        for number, item in enumerate(listshop, start=1):
+            yield (f'{number}: {item["ingredient__name"]} - '
+                   f'{item["ingredient_total"]}'
+                   f'{item["ingredient__measurement_unit"]}\n')
 
-    @action(detail=False, permission_classes=[IsAuthenticated])
+    def csv_method(self, listshop):
+        """
+        функция выгрузки списка покупок в CSV
+        """
+        writer = csv.writer(Echo())
+        yield writer.writerow(('name', 'measurement_unit', 'amount'))
+        for item in listshop:
+            yield writer.writerow((
+                item['ingredient__name'],
+                item['ingredient__measurement_unit'],
+                item['ingredient_total'],
+            ))
+
+    def json_method(self, listshop):
+        """
+        функция выгрузки списка покупок в JSON
+        """
+        yield '['
+        for number, item in enumerate(listshop):
+            if number:
+                yield ', '
+            yield json.dumps({
+                'name': item['ingredient__name'],
+                'measurement_unit': item['ingredient__measurement_unit'],
+                'amount': item['ingredient_total'],
+            }, ensure_ascii=False)
+        yield ']'
+
+    def pdf_response(self, ingredients):
+        key = 'shopping_cart_pdf_' + hashlib.sha256(
+            json.dumps(ingredients, ensure_ascii=False).encode()
+        ).hexdigest()
+        pdf = cache.get(key)
+        if pdf is None:
+            pdf = self.canvas_method(ingredients)
+            cache.set(key, pdf, SHOPPING_CART_CACHE_TIMEOUT)
+        return FileResponse(
+            BytesIO(pdf),
+            as_attachment=True,
+            filename='shopping_cart.pdf',
+            content_type='application/pdf',
+        )
+
+    @action(detail=False, permission_classes=[IsAuthenticated],
+            renderer_classes=[PDFRenderer, PlainTextRenderer,
+                              CSVRenderer, JSONRenderer],
+            use_replica=False)
     def download_shopping_cart(self, request):
-        ingredients = CountOfIngredient.objects.filter(
-            recipe__in_shopping_cart__user=request.user
+        """
+        Выгрузка списка покупок. Формат выбирается параметром `format`
+        (pdf, txt, csv, json) или заголовком Accept, по умолчанию PDF.
+        Строки читаются из базы здесь же: потоком отдаётся только
+        их форматирование, которое под ASGI идёт в цикле событий.
+        """
+        ingredients = list(ListShopIngredient.objects.filter(
+            user=request.user, total_amount__gt=0
         ).values(
             'ingredient__name', 'ingredient__measurement_unit'
         ).order_by(
             'ingredient__name'
-        ).annotate(ingredient_total=Sum('amount'))
-        return self.canvas_method(ingredients)
+        ).annotate(ingredient_total=Sum('total_amount')))
+        renderer = request.accepted_renderer
+        if renderer.format == 'pdf':
+            return self.pdf_response(ingredients)
+        methods = {
+            'txt': self.text_method,
+            'csv': self.csv_method,
+            'json': self.json_method,
+        }
+        response = StreamingHttpResponse(
+            methods[renderer.format](ingredients),
+            content_type=f'{renderer.media_type}; charset=utf-8',
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_cart.{renderer.format}"')
+        return response
 
 
 class NewUserViewSet(DjoserUserViewSet):
@@ -186,7 +473,53 @@ class SubscriptionViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
     serializer_class = SubscriptionSerializer
 
     def get_queryset(self):
-        return Subscription.objects.filter(follower=self.request.user)
+        return Subscription.objects.filter(
+            follower=self.request.user
+        ).select_related('following').annotate(
+            recipes_count=Count('following__recipes')
+        )
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['recipes'] = getattr(self, 'recipes', None)
+        return context
+
+    def get_recipes(self, subscriptions):
+        """
+        Рецепты всех авторов страницы одним запросом:
+        не более `recipes_limit` последних рецептов на автора
+        """
+        recipes = defaultdict(list)
+        if not subscriptions:
+            return recipes
+        queryset = Recipe.objects.filter(
+            author_id__in=[item.following_id for item in subscriptions]
+        ).only('id', 'name', 'image', 'cooking_time', 'author_id')
+        recipes_limit = self.request.query_params.get('recipes_limit')
+        if recipes_limit:
+            sql, params = queryset.annotate(
+                row_number=Window(
+                    expression=RowNumber(),
+                    partition_by=[F('author_id')],
+                    order_by=F('pub_date').desc(),
+                )
+            ).order_by().query.sql_with_params()
+            queryset = Recipe.objects.raw(
+                f'SELECT * FROM ({sql}) ranked '
+                'WHERE row_number <= %s '
+                'ORDER BY author_id, row_number',
+                (*params, int(recipes_limit))
+            )
+        for recipe in queryset:
+            recipes[recipe.author_id].append(recipe)
+        return recipes
+
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(
+            self.filter_queryset(self.get_queryset()))
+        self.recipes = self.get_recipes(page)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
 
 class SubscriptionCreateDestroyView(APIView):
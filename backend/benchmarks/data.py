@@ -0,0 +1,159 @@
+"""
+Генератор данных для бенчмарков: пользователи, рецепты с тегами
+и ингредиентами, избранное, корзины и подписки заданного объёма.
+Данные воспроизводимы при одинаковом seed.
+"""
+import random
+from datetime import timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import transaction
+from django.utils import timezone
+
+from recipes.models import (COLOR_CHOICES, CountOfIngredient, Favorite,
+                            Ingredient, ListShop, Recipe, Tag)
+from users.models import Subscription, User
+
+BATCH_SIZE = 2000
+CART_LINES = 200
+INGREDIENTS_PER_RECIPE = 5
+
+
+def generate(users=200, recipes=10000, favorites=20, cart=10,
+             subscriptions=20, seed=0):
+    """
+    Заполняет пустую базу. Первый пользователь — основной участник
+    сценариев: у него подписки, избранное и корзина на CART_LINES
+    ингредиентов.
+    """
+    rnd = random.Random(seed)
+    with transaction.atomic():
+        ingredients = create_ingredients()
+        tags = create_tags()
+        authors = create_users(users)
+        recipe_ids = create_recipes(rnd, authors, recipes, ingredients, tags)
+        create_relations(rnd, authors, recipe_ids, favorites, cart,
+                         subscriptions)
+    call_command('recalculate_recipe_counters', stdout=StringIO())
+    call_command('rebuild_shopping_lists', stdout=StringIO())
+    cache.clear()
+    return authors[0]
+
+
+def create_ingredients():
+    call_command(
+        'import_ingredients',
+        str(settings.BASE_DIR / 'data' / 'ingredients.json'),
+        stdout=StringIO(),
+    )
+    return list(Ingredient.objects.order_by('id').values_list('id', flat=True))
+
+
+def create_tags():
+    Tag.objects.bulk_create(
+        Tag(name=name, color=color, slug=f'tag{number}')
+        for number, (color, name) in enumerate(COLOR_CHOICES)
+    )
+    return list(Tag.objects.order_by('id').values_list('id', flat=True))
+
+
+def create_users(count):
+    User.objects.bulk_create(
+        (
+            User(
+                username=f'bench{number}',
+                email=f'bench{number}@example.com',
+                first_name='Бенчмарк',
+                last_name=str(number),
+                password=f'!bench{number}',
+            )
+            for number in range(count)
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    return list(User.objects.filter(
+        username__startswith='bench').order_by('id'))
+
+
+def create_recipes(rnd, authors, count, ingredients, tags):
+    """
+    Ингредиенты рецепта идут подряд по кругу справочника, поэтому первые
+    рецепты вместе покрывают CART_LINES разных ингредиентов
+    """
+    now = timezone.now()
+    Recipe.objects.bulk_create(
+        (
+            Recipe(
+                author=rnd.choice(authors),
+                name=f'Рецепт {number}',
+                text='Описание рецепта для бенчмарка',
+                image='recipes/images/bench.png',
+                cooking_time=rnd.randint(1, 180),
+            )
+            for number in range(count)
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    recipes = list(Recipe.objects.order_by('id').only('id'))
+    for number, recipe in enumerate(recipes):
+        recipe.pub_date = now - timedelta(minutes=number)
+    Recipe.objects.bulk_update(recipes, ['pub_date'], batch_size=BATCH_SIZE)
+    CountOfIngredient.objects.bulk_create(
+        (
+            CountOfIngredient(
+                recipe_id=recipe.id,
+                ingredient_id=ingredients[
+                    (number * INGREDIENTS_PER_RECIPE + offset)
+                    % len(ingredients)
+                ],
+                amount=rnd.randint(1, 500),
+            )
+            for number, recipe in enumerate(recipes)
+            for offset in range(INGREDIENTS_PER_RECIPE)
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    Recipe.tags.through.objects.bulk_create(
+        (
+            Recipe.tags.through(recipe_id=recipe.id, tag_id=tag_id)
+            for recipe in recipes
+            for tag_id in rnd.sample(tags, rnd.randint(1, len(tags)))
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    return [recipe.id for recipe in recipes]
+
+
+def create_relations(rnd, authors, recipe_ids, favorites, cart,
+                     subscriptions):
+    main = authors[0]
+    cart_recipes = {
+        main.id: recipe_ids[:CART_LINES // INGREDIENTS_PER_RECIPE]
+    }
+    favorite_recipes = {}
+    for user in authors:
+        favorite_recipes[user.id] = rnd.sample(recipe_ids, favorites)
+        cart_recipes.setdefault(user.id, rnd.sample(recipe_ids, cart))
+    Favorite.objects.bulk_create(
+        (
+            Favorite(user_id=user_id, recipe_id=recipe_id)
+            for user_id, ids in favorite_recipes.items()
+            for recipe_id in ids
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    ListShop.objects.bulk_create(
+        (
+            ListShop(user_id=user_id, recipe_id=recipe_id)
+            for user_id, ids in cart_recipes.items()
+            for recipe_id in ids
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    Subscription.objects.bulk_create(
+        Subscription(follower=main, following=author)
+        for author in authors[1:subscriptions + 1]
+    )
@@ -0,0 +1,128 @@
+"""
+Нагрузочный тест API: заданное число одновременных клиентов
+запрашивает адреса по кругу в течение заданного времени.
+
+Пример сравнения режимов на одном сервере:
+
+    SERVER_MODE=wsgi gunicorn foodgram.wsgi:application -c gunicorn.conf.py
+    python benchmarks/loadtest.py http://localhost:8000 -o wsgi.json
+
+    SERVER_MODE=asgi gunicorn foodgram.asgi:application -c gunicorn.conf.py
+    python benchmarks/loadtest.py http://localhost:8000 -o asgi.json
+"""
+import argparse
+import asyncio
+import json
+import time
+from urllib.parse import quote, urlsplit
+
+DEFAULT_PATHS = (
+    '/api/recipes/',
+    '/api/recipes/?limit=50',
+    '/api/tags/',
+    '/api/ingredients/?name=са',
+)
+
+
+def percentile(values, percent):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def summarize(latencies, errors, duration):
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / duration, 1),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+    } if latencies else {'requests': 0, 'errors': errors}
+
+
+async def fetch(host, port, path, headers):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        target = quote(path, safe='/?=&')
+        request = f'GET {target} HTTP/1.1\r\nHost: {host}\r\n'
+        for name, value in headers.items():
+            request += f'{name}: {value}\r\n'
+        writer.write((request + 'Connection: close\r\n\r\n').encode())
+        await writer.drain()
+        status_line = await reader.readline()
+        await reader.read()
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+
+async def client(base, paths, headers, deadline, results, offset):
+    host, port = base.hostname, base.port or 80
+    number = offset
+    while time.monotonic() < deadline:
+        path = paths[number % len(paths)]
+        number += 1
+        started = time.monotonic()
+        try:
+            status = await fetch(host, port, path, headers)
+        except OSError:
+            status = None
+        latencies, errors = results.setdefault(path, ([], [0]))
+        if status is not None and status < 400:
+            latencies.append(time.monotonic() - started)
+        else:
+            errors[0] += 1
+
+
+async def run(base, paths, concurrency, duration, headers):
+    results = {}
+    started = time.monotonic()
+    deadline = started + duration
+    await asyncio.gather(*(
+        client(base, paths, headers, deadline, results, offset)
+        for offset in range(concurrency)
+    ))
+    elapsed = time.monotonic() - started
+    report = {
+        path: summarize(latencies, errors[0], elapsed)
+        for path, (latencies, errors) in results.items()
+    }
+    report['total'] = summarize(
+        [value for latencies, _ in results.values() for value in latencies],
+        sum(errors[0] for _, errors in results.values()),
+        elapsed,
+    )
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('url', help='Адрес сервера, например http://x:8000')
+    parser.add_argument('paths', nargs='*', default=DEFAULT_PATHS)
+    parser.add_argument('-c', '--concurrency', type=int, default=200)
+    parser.add_argument('-d', '--duration', type=float, default=30)
+    parser.add_argument('-t', '--token', help='Токен пользователя')
+    parser.add_argument('-o', '--output', help='Файл для отчёта в JSON')
+    args = parser.parse_args()
+    headers = {'Authorization': f'Token {args.token}'} if args.token else {}
+    report = asyncio.run(run(
+        urlsplit(args.url), args.paths, args.concurrency, args.duration,
+        headers,
+    ))
+    report = {
+        'url': args.url,
+        'concurrency': args.concurrency,
+        'duration': args.duration,
+        'results': report,
+    }
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output)
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
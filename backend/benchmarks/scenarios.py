@@ -0,0 +1,132 @@
+"""
+Сценарии бенчмарка API. Каждый сценарий выполняет серию GET-запросов
+через тестовый клиент и сообщает число SQL-запросов, время в базе,
+p50/p95/p99 и пропускную способность.
+"""
+import random
+import time
+
+from django.core.cache import cache
+from rest_framework.pagination import Cursor
+from rest_framework.test import APIClient
+
+from api.middleware import QueryProfile, _profile, enable_query_profiling
+from api.pagination import RecipeCursorPagination
+from benchmarks.loadtest import percentile
+from recipes.models import Ingredient, Recipe, Tag
+
+DEEP_PAGE = 500
+PAGE_SIZE = 6
+
+
+def measure(client, paths, iterations, before=None):
+    """Первый запрос прогревочный и в результат не входит"""
+    durations, queries, db_time = [], [], []
+    for number in range(iterations + 1):
+        path = paths[number % len(paths)]
+        if before is not None:
+            before()
+        profile = QueryProfile(track_sql=False)
+        token = _profile.set(profile)
+        start = time.perf_counter()
+        try:
+            response = client.get(path)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        finally:
+            _profile.reset(token)
+        elapsed = time.perf_counter() - start
+        if response.status_code != 200:
+            raise RuntimeError(f'{path}: ответ {response.status_code}')
+        if number:
+            durations.append(elapsed)
+            queries.append(profile.count)
+            db_time.append(profile.duration)
+    return {
+        'paths': sorted(set(paths)),
+        'iterations': iterations,
+        'queries': max(queries),
+        'db_ms': round(sum(db_time) / len(db_time) * 1000, 2),
+        'p50_ms': round(percentile(durations, 50) * 1000, 2),
+        'p95_ms': round(percentile(durations, 95) * 1000, 2),
+        'p99_ms': round(percentile(durations, 99) * 1000, 2),
+        'rps': round(len(durations) / sum(durations), 1),
+    }
+
+
+def cursor_path(offset):
+    """Адрес страницы курсорной ленты, начинающейся с позиции offset"""
+    paginator = RecipeCursorPagination()
+    paginator.base_url = (
+        f'/api/recipes/?pagination=cursor&limit={PAGE_SIZE}')
+    paginator.ordering = RecipeCursorPagination.ordering
+    previous = Recipe.objects.order_by(
+        *RecipeCursorPagination.ordering)[offset - 1]
+    return paginator.encode_cursor(
+        Cursor(offset=0, reverse=False, position=str(previous.pub_date)))
+
+
+def autocomplete_paths(rnd, length, count, param='name'):
+    names = list(Ingredient.objects.values_list('name', flat=True))
+    return [
+        f'/api/ingredients/?{param}={name[:length]}'
+        for name in rnd.sample(names, count)
+    ]
+
+
+def get_scenarios(user, iterations, seed=0):
+    """Сценарии в виде (имя, клиент, адреса, действие перед запросом)"""
+    rnd = random.Random(seed)
+    anonymous = APIClient()
+    client = APIClient()
+    client.force_authenticate(user)
+    tags = list(Tag.objects.values_list('slug', flat=True))
+    author = user.subscribing.values_list('following_id', flat=True)[0]
+    recipe = Recipe.objects.order_by('-pub_date').first()
+    page = max(2, min(DEEP_PAGE, Recipe.objects.count() // PAGE_SIZE))
+    deep = f'/api/recipes/?limit={PAGE_SIZE}&page={page}'
+    scenarios = [
+        ('feed', anonymous, [f'/api/recipes/?limit={PAGE_SIZE}'], None),
+        ('feed_authenticated', client,
+         [f'/api/recipes/?limit={PAGE_SIZE}'], None),
+        ('feed_page_deep', client, [deep], None),
+        ('feed_page_deep_estimate', client, [f'{deep}&count=estimate'],
+         None),
+        ('feed_cursor_first', client,
+         [f'/api/recipes/?pagination=cursor&limit={PAGE_SIZE}'], None),
+        ('feed_cursor_deep', client,
+         [cursor_path(PAGE_SIZE * (page - 1))], None),
+        ('feed_filter_tags', client,
+         [f'/api/recipes/?tags={tags[0]}&tags={tags[1]}'], None),
+        ('feed_filter_favorited', client,
+         ['/api/recipes/?is_favorited=1'], None),
+        ('feed_filter_author', client,
+         [f'/api/recipes/?author={author}'], None),
+        ('feed_popular', client, ['/api/recipes/?ordering=popular'], None),
+        ('feed_search', client, ['/api/recipes/?search=рецепт 42'], None),
+        ('recipe_detail', client, [f'/api/recipes/{recipe.id}/'], None),
+        ('subscriptions', client,
+         ['/api/users/subscriptions/?recipes_limit=3'], None),
+        ('ingredient_search', anonymous,
+         autocomplete_paths(rnd, 3, iterations, 'search'), None),
+        ('shopping_cart_pdf_cold', client,
+         ['/api/recipes/download_shopping_cart/'], cache.clear),
+        ('shopping_cart_pdf_warm', client,
+         ['/api/recipes/download_shopping_cart/'], None),
+    ]
+    for length in range(1, 5):
+        scenarios.append((
+            f'ingredient_autocomplete_prefix_{length}', anonymous,
+            autocomplete_paths(rnd, length, iterations), None,
+        ))
+    return scenarios
+
+
+def run(user, iterations=20, names=None, seed=0):
+    enable_query_profiling()
+    return {
+        name: measure(client, paths, iterations, before)
+        for name, client, paths, before
+        in get_scenarios(user, iterations, seed)
+        if not names or name in names
+    }
@@ -1,8 +1,8 @@
 from django.contrib.admin import ModelAdmin, display, register
 from django.db.models import Count, Sum
 
-from .models import (CountOfIngredient, Favorite, Ingredient, ListShop, Recipe,
-                     Tag)
+from .models import (CountOfIngredient, Favorite, Ingredient, ListShop,
+                     ListShopIngredient, Recipe, Tag)
 
 
 @register(Ingredient)
@@ -28,7 +28,7 @@ class RecipeAdmin(ModelAdmin):
 
     @display(description='Общее число добавлений в избранное')
     def added_in_favorites(self, obj):
-        return obj.favorites.count()
+        return obj.favorites_count
 
 
 @register(CountOfIngredient)
@@ -54,3 +54,9 @@ class ListShopAdmin(ModelAdmin):
             obj.recipes.all().annotate(count_ingredients=Count('ingredients'))
             .aggregate(total=Sum('count_ingredients'))['total']
         )
+
+
+@register(ListShopIngredient)
+class ListShopIngredientAdmin(ModelAdmin):
+    list_display = ('user', 'ingredient', 'total_amount',)
+    list_filter = ('user',)
@@ -0,0 +1,30 @@
+from django.apps import AppConfig
+from django.db.models.signals import post_delete, pre_delete
+
+
+class RecipesConfig(AppConfig):
+    name = 'recipes'
+
+    def ready(self):
+        from users.models import User
+
+        from .models import Recipe
+        from .renditions import release_recipe_image
+        from .signals import (decrease_recipe_counters,
+                              remove_recipe_from_shopping_lists)
+
+        pre_delete.connect(
+            decrease_recipe_counters,
+            sender=User,
+            dispatch_uid='decrease_recipe_counters',
+        )
+        pre_delete.connect(
+            remove_recipe_from_shopping_lists,
+            sender=Recipe,
+            dispatch_uid='remove_recipe_from_shopping_lists',
+        )
+        post_delete.connect(
+            release_recipe_image,
+            sender=Recipe,
+            dispatch_uid='release_recipe_image',
+        )
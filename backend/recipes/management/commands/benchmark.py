@@ -0,0 +1,64 @@
+import json
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_databases, teardown_databases
+
+from benchmarks import data, scenarios
+
+
+class Command(BaseCommand):
+    help = ('Заполняет отдельную тестовую базу данными заданного объёма '
+            'и замеряет сценарии API, результат выводится в JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--favorites', type=int, default=20)
+        parser.add_argument('--cart', type=int, default=10)
+        parser.add_argument('--subscriptions', type=int, default=20)
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--scenario',
+            action='append',
+            help='Запустить только указанные сценарии',
+        )
+        parser.add_argument('--output', help='Файл для отчёта')
+
+    def handle(self, *args, **options):
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            user = data.generate(
+                users=options['users'],
+                recipes=options['recipes'],
+                favorites=options['favorites'],
+                cart=options['cart'],
+                subscriptions=options['subscriptions'],
+                seed=options['seed'],
+            )
+            report = {
+                'meta': {
+                    'database': connection.vendor,
+                    'django': django.get_version(),
+                    'users': options['users'],
+                    'recipes': options['recipes'],
+                    'iterations': options['iterations'],
+                    'seed': options['seed'],
+                },
+                'scenarios': scenarios.run(
+                    user,
+                    iterations=options['iterations'],
+                    names=options['scenario'],
+                    seed=options['seed'],
+                ),
+            }
+        finally:
+            teardown_databases(old_config, verbosity=0)
+        output = json.dumps(report, ensure_ascii=False, indent=2,
+                            sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output)
+        self.stdout.write(output)
@@ -0,0 +1,71 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Удаляет из хранилища картинки рецептов и их копии, '
+            'на которые не ссылается ни один рецепт')
+
+    directories = ('recipes/images', 'recipes/renditions')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, что будет удалено',
+        )
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=settings.RECIPE_IMAGE_GRACE_PERIOD,
+            help='Не трогать файлы моложе этого числа секунд',
+        )
+
+    def get_referenced(self):
+        referenced = set()
+        for image, renditions in Recipe.objects.values_list(
+            'image', 'image_renditions'
+        ).iterator():
+            referenced.add(image)
+            for names in (renditions or {}).values():
+                referenced.update(names.values())
+        return referenced
+
+    def scan(self, path):
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    yield from self.scan(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry
+
+    def handle(self, *args, **options):
+        storage = Recipe._meta.get_field('image').storage
+        referenced = self.get_referenced()
+        deadline = time.time() - options['min_age']
+        removed = removed_size = 0
+        for directory in self.directories:
+            path = storage.path(directory)
+            if not os.path.isdir(path):
+                continue
+            for entry in self.scan(path):
+                name = os.path.relpath(
+                    entry.path, storage.location).replace(os.sep, '/')
+                stat = entry.stat()
+                if name in referenced or stat.st_mtime > deadline:
+                    continue
+                removed += 1
+                removed_size += stat.st_size
+                if options['dry_run']:
+                    self.stdout.write(name)
+                else:
+                    storage.delete(name)
+        self.stdout.write(
+            f'Удалено файлов: {removed}, '
+            f'{removed_size / (1024 * 1024):.1f} МБ'
+            + (' (пробный запуск)' if options['dry_run'] else ''))
@@ -0,0 +1,150 @@
+import csv
+import io
+import json
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from api.cache import bump_catalog_version
+from recipes.models import Ingredient
+
+CHUNK_SIZE = 64 * 1024
+
+
+class Command(BaseCommand):
+    help = ('Загружает справочник ингредиентов из JSON или CSV '
+            'пакетами, пропуская уже существующие пары '
+            'название + единица измерения')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default='data/ingredients.json',
+        )
+        parser.add_argument(
+            '--format',
+            choices=('json', 'csv'),
+            help='По умолчанию определяется по расширению файла',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+        )
+
+    def read_json(self, file):
+        """
+        Потоковое чтение массива объектов: файл не загружается
+        в память целиком
+        """
+        decoder = json.JSONDecoder()
+        buffer = file.read(CHUNK_SIZE).lstrip()
+        if not buffer.startswith('['):
+            raise CommandError('Ожидается JSON-массив объектов')
+        position = 1
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if buffer.startswith(']', position):
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                chunk = file.read(CHUNK_SIZE)
+                if not chunk:
+                    raise CommandError('Файл JSON оборван')
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+            yield item['name'], item['measurement_unit']
+
+    def read_csv(self, file):
+        """CSV с заголовком name,measurement_unit или без него"""
+        reader = csv.reader(file)
+        for row in reader:
+            if reader.line_num == 1 and row == ['name', 'measurement_unit']:
+                continue
+            if len(row) != 2:
+                raise CommandError(
+                    f'Строка {reader.line_num}: ожидается два столбца')
+            yield row
+
+    def clean(self, rows):
+        name_length = Ingredient._meta.get_field('name').max_length
+        unit_length = Ingredient._meta.get_field(
+            'measurement_unit').max_length
+        for name, unit in rows:
+            name, unit = name.strip(), unit.strip()
+            if not name or len(name) > name_length or len(unit) > unit_length:
+                self.skipped += 1
+                continue
+            yield name, unit
+
+    def insert_batch(self, batch):
+        Ingredient.objects.bulk_create(
+            (
+                Ingredient(name=name, measurement_unit=unit)
+                for name, unit in batch
+            ),
+            ignore_conflicts=True,
+        )
+
+    def copy_batch(self, batch):
+        """
+        На PostgreSQL пакет загружается через COPY во временную таблицу
+        и переносится одним INSERT ... ON CONFLICT DO NOTHING
+        """
+        table = connection.ops.quote_name(Ingredient._meta.db_table)
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(batch)
+        buffer.seek(0)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMPORARY TABLE IF NOT EXISTS import_ingredient '
+                '(name text, measurement_unit text) ON COMMIT DELETE ROWS')
+            cursor.cursor.copy_expert(
+                'COPY import_ingredient FROM STDIN WITH (FORMAT csv)',
+                buffer)
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                'SELECT name, measurement_unit FROM import_ingredient '
+                'ON CONFLICT DO NOTHING')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        file_format = options['format'] or path.suffix.lstrip('.').lower()
+        if file_format not in ('json', 'csv'):
+            raise CommandError('Укажите --format json или csv')
+        save_batch = (
+            self.copy_batch if connection.vendor == 'postgresql'
+            else self.insert_batch
+        )
+        self.skipped = 0
+        read = received = 0
+        before = Ingredient.objects.count()
+        start = time.perf_counter()
+        with open(path, encoding='utf-8', newline='') as file:
+            rows = self.clean(getattr(self, f'read_{file_format}')(file))
+            while True:
+                batch = list(islice(rows, options['batch_size']))
+                if not batch:
+                    break
+                read += len(batch)
+                batch = list(dict.fromkeys(batch))
+                received += len(batch)
+                with transaction.atomic():
+                    save_batch(batch)
+        elapsed = time.perf_counter() - start
+        created = Ingredient.objects.count() - before
+        if created:
+            bump_catalog_version(Ingredient)
+        self.stdout.write(
+            f'Прочитано: {read + self.skipped}, добавлено: {created}, '
+            f'уже были: {received - created}, '
+            f'дубликатов в файле: {read - received}, '
+            f'пропущено: {self.skipped}, '
+            f'{elapsed:.2f} с, {(read + self.skipped) / elapsed:.0f} строк/с')
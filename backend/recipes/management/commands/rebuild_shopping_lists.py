@@ -0,0 +1,72 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum
+
+from recipes.models import CountOfIngredient, ListShopIngredient
+
+
+class Command(BaseCommand):
+    help = ('Пересобирает сводные списки покупок из рецептов в корзинах '
+            'и сверяет их с живой агрегацией')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сверить, не пересобирая',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+        )
+
+    def live_totals(self):
+        return CountOfIngredient.objects.filter(
+            recipe__in_shopping_cart__isnull=False
+        ).values(
+            'recipe__in_shopping_cart__user', 'ingredient'
+        ).order_by().annotate(total=Sum('amount'))
+
+    def rebuild(self, batch_size):
+        ListShopIngredient.objects.all().delete()
+        ListShopIngredient.objects.bulk_create(
+            (
+                ListShopIngredient(
+                    user_id=item['recipe__in_shopping_cart__user'],
+                    ingredient_id=item['ingredient'],
+                    total_amount=item['total'],
+                )
+                for item in self.live_totals().iterator()
+            ),
+            batch_size=batch_size,
+        )
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            with transaction.atomic():
+                self.rebuild(options['batch_size'])
+        expected = {
+            (item['recipe__in_shopping_cart__user'], item['ingredient']):
+                item['total']
+            for item in self.live_totals().iterator()
+            if item['total'] > 0
+        }
+        actual = dict(
+            ((user_id, ingredient_id), total_amount)
+            for user_id, ingredient_id, total_amount
+            in ListShopIngredient.objects.filter(
+                total_amount__gt=0
+            ).values_list(
+                'user_id', 'ingredient_id', 'total_amount'
+            ).iterator()
+        )
+        mismatched = {
+            key for key in expected.keys() | actual.keys()
+            if expected.get(key) != actual.get(key)
+        }
+        if mismatched:
+            raise CommandError(
+                f'Расхождений в списках покупок: {len(mismatched)}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Списки покупок совпадают, строк: {len(actual)}'))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, ListShop, Recipe
+
+
+class Command(BaseCommand):
+    help = ('Сверяет счётчики избранного и списков покупок рецептов '
+            'с фактическими данными и исправляет расхождения')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сверить, не исправляя',
+        )
+
+    def handle(self, *args, **options):
+        for model in (Favorite, ListShop):
+            counter = model.recipe_counter
+            actual = Coalesce(Subquery(
+                model.objects.filter(
+                    recipe=OuterRef('pk')
+                ).order_by().values('recipe').annotate(
+                    total=Count('id')
+                ).values('total')
+            ), 0)
+            with transaction.atomic():
+                drifted = Recipe.objects.annotate(
+                    actual=actual
+                ).exclude(**{counter: F('actual')})
+                ids = list(drifted.values_list('id', flat=True))
+                if ids and not options['check']:
+                    Recipe.objects.filter(
+                        id__in=ids).update(**{counter: actual})
+            self.stdout.write(f'{counter}: расхождений {len(ids)}')
@@ -0,0 +1,58 @@
+# Generated by Django 3.2.14 on 2026-10-18 01:29
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def fill_shopping_lists(apps, schema_editor):
+    CountOfIngredient = apps.get_model('recipes', 'CountOfIngredient')
+    ListShopIngredient = apps.get_model('recipes', 'ListShopIngredient')
+    totals = CountOfIngredient.objects.filter(
+        recipe__in_shopping_cart__isnull=False
+    ).values(
+        'recipe__in_shopping_cart__user', 'ingredient'
+    ).order_by().annotate(total=Sum('amount'))
+    ListShopIngredient.objects.bulk_create(
+        (
+            ListShopIngredient(
+                user_id=item['recipe__in_shopping_cart__user'],
+                ingredient_id=item['ingredient'],
+                total_amount=item['total'],
+            )
+            for item in totals.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0007_remove_listshop_recipes_listshop_recipe_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListShopIngredient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_amount', models.IntegerField(verbose_name='Общее количество')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='in_shopping_lists', to='recipes.ingredient', verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list_ingredients', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Ингредиент списка покупок',
+                'verbose_name_plural': 'Ингредиенты списков покупок',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='listshopingredient',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_shopping_list_ingredient'),
+        ),
+        migrations.RunPython(
+            fill_shopping_lists, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 3.2.14 on 2026-10-18 01:46
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    CountOfIngredient = apps.get_model('recipes', 'CountOfIngredient')
+    ListShopIngredient = apps.get_model('recipes', 'ListShopIngredient')
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit'
+    ).order_by().annotate(
+        first_id=Min('id'), total=Count('id')
+    ).filter(total__gt=1)
+    for group in duplicates:
+        kept = group['first_id']
+        extra = list(Ingredient.objects.filter(
+            name=group['name'],
+            measurement_unit=group['measurement_unit'],
+        ).exclude(id=kept).values_list('id', flat=True))
+        for model, owner, value in (
+            (CountOfIngredient, 'recipe_id', 'amount'),
+            (ListShopIngredient, 'user_id', 'total_amount'),
+        ):
+            rows = {
+                getattr(row, owner): row
+                for row in model.objects.filter(ingredient_id=kept)
+            }
+            for row in model.objects.filter(ingredient_id__in=extra):
+                target = rows.get(getattr(row, owner))
+                if target is None:
+                    row.ingredient_id = kept
+                    row.save(update_fields=['ingredient'])
+                    rows[getattr(row, owner)] = row
+                else:
+                    setattr(target, value,
+                            getattr(target, value) + getattr(row, value))
+                    target.save(update_fields=[value])
+                    row.delete()
+        Ingredient.objects.filter(id__in=extra).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_recipe_image_storage'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient'),
+        ),
+    ]
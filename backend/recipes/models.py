@@ -1,8 +1,12 @@
-from django.db import models
+from django.contrib.postgres.search import SearchVectorField
+from django.db import connections, models, router
+from django.db.models import F, OuterRef, Subquery, Sum
 from django.urls import reverse
 
 from users.models import User
 
+from .storage import ContentAddressedStorage
+
 BLUE = "#1965b5"
 GREEN = "#0dbf60"
 RED = "#e6766a"
@@ -30,6 +34,12 @@ class Ingredient(models.Model):
         ordering = ['name']
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='unique_ingredient',
+            ),
+        )
 
     def __str__(self):
         return self.name
@@ -78,6 +88,7 @@ class Recipe(models.Model):
     image = models.ImageField(
         'Картинка блюда',
         upload_to='recipes/images',
+        storage=ContentAddressedStorage(),
     )
     text = models.TextField(
         'Описание рецепта',
@@ -100,11 +111,42 @@ class Recipe(models.Model):
     cooking_time = models.PositiveIntegerField(
         'Время приготовления блюда',
     )
+    favorites_count = models.PositiveIntegerField(
+        'Число добавлений в избранное',
+        default=0,
+        editable=False,
+    )
+    cart_count = models.PositiveIntegerField(
+        'Число добавлений в список покупок',
+        default=0,
+        editable=False,
+    )
+    image_renditions = models.JSONField(
+        'Уменьшенные копии картинки',
+        default=dict,
+        blank=True,
+        editable=False,
+    )
+    search_vector = SearchVectorField(
+        'Поисковый вектор',
+        null=True,
+        editable=False,
+    )
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='recipe_pub_date_id_idx',
+            ),
+            models.Index(
+                fields=('-favorites_count', '-pub_date'),
+                name='recipe_popular_idx',
+            ),
+        )
 
     def __str__(self):
         return f'{self.name} ({self.author})'
@@ -147,7 +189,40 @@ class CountOfIngredient(models.Model):
         )
 
 
+class UserRecipeManager(models.Manager):
+    """
+    Связи пользователей с рецептами: избранное и список покупок
+    """
+    def add_recipes(self, user, recipe_ids):
+        """
+        Добавляет пользователю рецепты одним запросом
+        INSERT ... SELECT ... ON CONFLICT DO NOTHING RETURNING и возвращает
+        id действительно добавленных: уже добавленные и несуществующие
+        рецепты пропускаются без ошибки уникальности. На SQLite нужна
+        версия 3.35 или новее.
+        """
+        if not recipe_ids:
+            return set()
+        connection = connections[router.db_for_write(self.model)]
+        quote = connection.ops.quote_name
+        user_column = self.model._meta.get_field('user').column
+        recipe_column = self.model._meta.get_field('recipe').column
+        placeholders = ', '.join(['%s'] * len(recipe_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {quote(self.model._meta.db_table)} '
+                f'({quote(user_column)}, {quote(recipe_column)}) '
+                f'SELECT %s, id FROM {quote(Recipe._meta.db_table)} '
+                f'WHERE id IN ({placeholders}) '
+                f'ON CONFLICT DO NOTHING RETURNING {quote(recipe_column)}',
+                [user.id, *recipe_ids],
+            )
+            return {row[0] for row in cursor.fetchall()}
+
+
 class Favorite(models.Model):
+    recipe_counter = 'favorites_count'
+
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -161,6 +236,8 @@ class Favorite(models.Model):
         verbose_name='Рецепт',
     )
 
+    objects = UserRecipeManager()
+
     class Meta:
         verbose_name = 'Избранное'
         verbose_name_plural = 'Избранное'
@@ -176,6 +253,8 @@ class Favorite(models.Model):
 
 
 class ListShop(models.Model):
+    recipe_counter = 'cart_count'
+
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -190,6 +269,8 @@ class ListShop(models.Model):
         verbose_name='Рецепты',
     )
 
+    objects = UserRecipeManager()
+
     class Meta:
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Списки покупок'
@@ -202,3 +283,93 @@ class ListShop(models.Model):
 
     def __str__(self):
         return f'{self.user} -> {self.recipe}'
+
+
+class ListShopIngredientManager(models.Manager):
+    """
+    Инкрементальное обновление сводного списка покупок
+    """
+    def add_recipe(self, recipe, user_ids=None):
+        self.change_recipe(recipe, user_ids, increase=True)
+
+    def remove_recipe(self, recipe, user_ids=None):
+        self.change_recipe(recipe, user_ids, increase=False)
+
+    def change_recipe(self, recipe, user_ids, increase):
+        """
+        Прибавляет или вычитает ингредиенты рецепта из списков покупок
+        пользователей `user_ids`, по умолчанию у всех, кто добавил рецепт
+        """
+        if user_ids is None:
+            user_ids = list(ListShop.objects.filter(
+                recipe=recipe).values_list('user_id', flat=True))
+        self.change_recipes([recipe], user_ids, increase)
+
+    def change_recipes(self, recipes, user_ids, increase):
+        """
+        Прибавляет или вычитает суммарные ингредиенты рецептов `recipes`
+        из списков покупок каждого из пользователей `user_ids`
+        """
+        ingredients = CountOfIngredient.objects.filter(recipe__in=recipes)
+        ingredient_ids = list(ingredients.values_list(
+            'ingredient_id', flat=True).distinct())
+        if not user_ids or not ingredient_ids:
+            return
+        if increase:
+            self.bulk_create(
+                [
+                    self.model(
+                        user_id=user_id,
+                        ingredient_id=ingredient_id,
+                        total_amount=0,
+                    )
+                    for user_id in user_ids
+                    for ingredient_id in ingredient_ids
+                ],
+                ignore_conflicts=True,
+            )
+        amount = Subquery(ingredients.filter(
+            ingredient=OuterRef('ingredient')
+        ).order_by().values('ingredient').annotate(
+            total=Sum('amount')
+        ).values('total'))
+        items = self.filter(
+            user_id__in=user_ids, ingredient_id__in=ingredient_ids)
+        if increase:
+            items.update(total_amount=F('total_amount') + amount)
+        else:
+            items.update(total_amount=F('total_amount') - amount)
+            items.filter(total_amount__lte=0).delete()
+
+
+class ListShopIngredient(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_ingredients',
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='in_shopping_lists',
+        verbose_name='Ингредиент',
+    )
+    total_amount = models.IntegerField(
+        'Общее количество',
+    )
+
+    objects = ListShopIngredientManager()
+
+    class Meta:
+        verbose_name = 'Ингредиент списка покупок'
+        verbose_name_plural = 'Ингредиенты списков покупок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_list_ingredient'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.user} -> {self.ingredient} ({self.total_amount})'
@@ -0,0 +1,98 @@
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+RENDITION_FORMATS = (('webp', 'WEBP'), ('jpg', 'JPEG'))
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.RECIPE_IMAGE_WORKERS,
+            thread_name_prefix='renditions',
+        )
+    return _executor
+
+
+def make_renditions(recipe_id, image_name):
+    """
+    Создаёт уменьшенные копии картинки рецепта в WebP и JPEG
+    и сохраняет их имена в `Recipe.image_renditions`
+    """
+    storage = Recipe._meta.get_field('image').storage
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    renditions = {}
+    try:
+        with storage.open(image_name) as file, Image.open(file) as image:
+            image = ImageOps.exif_transpose(image).convert('RGB')
+            for width in settings.RECIPE_IMAGE_WIDTHS:
+                if width > image.width and renditions:
+                    break
+                copy = image.copy()
+                copy.thumbnail((width, image.height))
+                for extension, image_format in RENDITION_FORMATS:
+                    buffer = BytesIO()
+                    copy.save(buffer, image_format, quality=80)
+                    renditions.setdefault(extension, {})[width] = storage.save(
+                        f'recipes/renditions/{stem}_{width}.{extension}',
+                        ContentFile(buffer.getvalue()),
+                    )
+        Recipe.objects.filter(id=recipe_id, image=image_name).update(
+            image_renditions=renditions)
+    except Exception:
+        logger.exception('Не удалось обработать картинку %s', image_name)
+    finally:
+        connections.close_all()
+
+
+def schedule_renditions(recipe):
+    """
+    Ставит обработку картинки в фоновый пул после фиксации транзакции
+    """
+    recipe_id, image_name = recipe.id, recipe.image.name
+    transaction.on_commit(lambda: get_executor().submit(
+        make_renditions, recipe_id, image_name))
+
+
+def release_image(image_name, renditions):
+    """
+    Удаляет картинку и её копии, если на неё больше не ссылается
+    ни один рецепт. Файлы моложе RECIPE_IMAGE_GRACE_PERIOD не трогаются:
+    такой же файл мог только что загрузить другой рецепт, ещё не
+    сохранённый в базе. Их позже уберёт collect_media_garbage.
+    """
+    if not image_name or Recipe.objects.filter(image=image_name).exists():
+        return
+    storage = Recipe._meta.get_field('image').storage
+    deadline = time.time() - settings.RECIPE_IMAGE_GRACE_PERIOD
+    names = [image_name]
+    for widths in renditions.values():
+        names.extend(widths.values())
+    for name in names:
+        try:
+            if os.path.getmtime(storage.path(name)) <= deadline:
+                storage.delete(name)
+        except FileNotFoundError:
+            pass
+
+
+def release_recipe_image(sender, instance, **kwargs):
+    """
+    Обработчик post_delete рецепта
+    """
+    image_name, renditions = instance.image.name, instance.image_renditions
+    transaction.on_commit(lambda: release_image(image_name, renditions))
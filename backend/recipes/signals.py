@@ -0,0 +1,24 @@
+from django.db.models import F
+
+from .models import Favorite, ListShop, ListShopIngredient, Recipe
+
+
+def decrease_recipe_counters(sender, instance, **kwargs):
+    """
+    Избранное и список покупок удаляются каскадом вместе с пользователем,
+    счётчики рецептов уменьшаются до удаления
+    """
+    for model in (Favorite, ListShop):
+        Recipe.objects.filter(
+            id__in=model.objects.filter(
+                user=instance).values('recipe_id')
+        ).update(**{model.recipe_counter: F(model.recipe_counter) - 1})
+
+
+def remove_recipe_from_shopping_lists(sender, instance, **kwargs):
+    """
+    Ингредиенты удаляемого рецепта вычитаются из сводных списков покупок,
+    пока рецепт и его ингредиенты ещё в базе: при удалении через API,
+    админку или каскадом вместе с автором
+    """
+    ListShopIngredient.objects.remove_recipe(instance)